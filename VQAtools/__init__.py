@@ -1,2 +1,15 @@
 from .vqa import VQA
-from .vqaEval import VQAEval
\ No newline at end of file
+from .vqaEval import VQAEval
+from .vqaNormalize import AnswerNormalizer
+from .vqaScore import AnswerCodebook
+from .vqaStream import streamJson
+from .vqaStore import VQAStore
+from .vqaGroundTruth import VQAGroundTruth
+from .vqaAccumulator import VQAAccumulator
+from .vqaVocab import AnswerVocab, SoftScoreMatrix
+from .vqaBatchEval import VQABatchEval
+from .vqaInstrument import Instrumentation
+from .vqaResults import EvalResults
+from .vqaImages import ImageLoader
+from .vqaQuestionTypes import QuestionTypeClassifier
+from .vqaMultipleChoice import MultipleChoiceIndex
@@ -10,9 +10,20 @@ __version__ = '0.9'
 #  VQA        - VQA class that loads VQA annotation file and prepares data structures.
 #  getQuesIds - Get question ids that satisfy given filter conditions.
 #  getImgIds  - Get image ids that satisfy given filter conditions.
+#  filterIndex - Get the inverted indexes used by getQuesIds and getImgIds.
+#  multipleChoiceIndex - Get the coded multiple choices of the questions.
+#  assignQuestionTypes - Assign question types to questions without annotations.
 #  loadQA     - Load questions and answers with the specified question ids.
+#  iterBatches - Iterate batches of records of one shard of the dataset.
 #  showQA     - Display the specified questions and answers.
+#  imageLoader - Create a threaded, cached loader of the images.
 #  loadRes    - Load result file and create result object.
+#  loadStreaming - Load question and annotation files record by record.
+#  loadCompact - Load question and annotation files into compact columnar storage.
+#  fromCache  - Create a VQA object from a memory-mapped columnar cache.
+#  subset     - Create a view of selected questions, sharing the records.
+#  concat     - Create a view of the questions of several VQA objects, sharing the records.
+#  saveCache  - Write the loaded data to a columnar cache.
 
 # Help on each function can be accessed by: "help(COCO.function)"
 
@@ -20,15 +31,41 @@ import pdb
 import json
 import datetime
 import copy
+import os
+import threading
+
+import numpy as np
+
+from .vqaGroundTruth import VQAGroundTruth
+from .vqaImages import ImageLoader
+from .vqaIndex import VQAIndex
+from .vqaMultipleChoice import MultipleChoiceIndex
+from .vqaNormalize import defaultNormalizer
+from .vqaQuestionTypes import QuestionTypeClassifier
+from .vqaInstrument import instrumentation
+from .vqaStore import VQAStore, StoreBuilder, QuestionMap, AnnotationMap, ImageMap
+from .vqaStream import openInput, streamJson, peakRSS
+from .vqaView import VQAView
+
+# serializes ground truth snapshot builds, so that concurrent evaluators build it once
+_groundTruthLock = threading.Lock()
+
+def _resultsReport(vqa, anns):
+    # imported here so that vqaValidate can run as a script
+    from .vqaValidate import ResultValidator, formatReport
+    return formatReport(ResultValidator(vqa).validateRecords(anns))
 
 class VQA:
-    def __init__(self, question_file, annotation_file=None, verbose=False):
+    def __init__(self, question_file, annotation_file=None, verbose=False, stream=False, instrument=None, compact=False):
         """Constructor of VQA helper class for reading and visualizing questions and answers.
 
         Args:
-            question_file (str): location of VQA question file
-            annotation_file (str, optional): location of VQA annotation file. If not specified (e.g., during test phase) some methods are not accessible. Defaults to None.
-            test_mode (bool, optional): set to True to avoid loading annotations. Defaults to False.
+            question_file (str): location of VQA question file; .gz, .bz2, .xz, .zst files and .zip archives (archive.zip or archive.zip/member.json) are decompressed on the fly
+            annotation_file (str, optional): location of VQA annotation file, possibly compressed. If not specified (e.g., during test phase) some methods are not accessible. Defaults to None.
+            verbose (bool, optional): print loading progress, timings and peak memory. Defaults to False.
+            stream (bool, optional): parse the files record by record and build the index while reading, without holding the whole document in memory. Defaults to False.
+            instrument (Instrumentation or callable, optional): receives the spans of the loading, indexing and validation phases. Defaults to None.
+            compact (bool, optional): stream the files into an in-memory VQAStore (typed arrays, interned strings) instead of keeping dict records; q2q, q2a, imgToQA and loadQA build records on demand. Defaults to False.
         """
         assert question_file, 'Question file must be always specified'
         self.annotations    = {}
@@ -36,45 +73,375 @@ class VQA:
         self.qa         = {}
         self.qqa        = {}
         self.imgToQA    = {}
+        self.store      = None
+        self.view       = None
+        self._filterIndex = None
+        self._mcIndex   = None
+        self._groundTruth = (None, {})
+        self.questionTypes = None
+        self.question_file = question_file
+        self.instrument = instrumentation(instrument)
 
         time_t = datetime.datetime.utcnow()
         #annotations
         self.annotations = None #quest_type + img_id + question_id + answers
         self.questions = None #question + image_id + question_id
+        if compact:
+            self.loadCompact(question_file, annotation_file, verbose)
+        elif stream:
+            self.loadStreaming(question_file, annotation_file, verbose)
+        else:
+            if annotation_file:
+                if verbose:
+                    print('loading VQA annotations and questions into memory...')
+                with openInput(annotation_file) as fh, self.instrument.span('parse.annotations') as span:
+                    self.annotations = json.load(fh)
+                    span['items'] = len(self.annotations['annotations'])
+            if question_file:
+                if verbose:
+                    print('eval mode: loading only VQA questions into memory...')
+                with openInput(question_file) as fh, self.instrument.span('parse.questions') as span:
+                    self.questions       = json.load(fh)
+                    span['items'] = len(self.questions['questions'])
+            if verbose:
+                print(datetime.datetime.utcnow() - time_t)
+            self.createIndex(verbose)
+        if verbose and peakRSS() is not None:
+            print('peak RSS: %0.1f MB' % peakRSS())
+
+    def loadStreaming(self, question_file, annotation_file=None, verbose=False):
+        """Load question and annotation files record by record, building the index on the fly.
+
+        The resulting object is identical to the one built by json.load and createIndex, but the
+        raw text and the whole parsed document are never in memory at the same time, and
+        repeated strings (types, answers) are interned.
+
+        Args:
+            question_file (str): location of VQA question file
+            annotation_file (str, optional): location of VQA annotation file. Defaults to None.
+            verbose (bool, optional): print loading progress. Defaults to False.
+        """
+        time_t = datetime.datetime.utcnow()
+        img2QA    = {}
+        q2a       = {}
+        q2q       = {}
+        questions = []
+        def addQuestion(ques):
+            questions.append(ques)
+            q2q[ques['question_id']] = ques
+            q2a[ques['question_id']] = []
+            if ques['image_id'] not in img2QA:
+                img2QA[ques['image_id']] = []
+        annotations = []
+        def addAnnotation(ann):
+            annotations.append(ann)
+            img2QA[ann['image_id']].append(ann)
+            q2a[ann['question_id']] = ann
+
+        if verbose:
+            print('streaming VQA questions and building index...')
+        with openInput(question_file) as fh, self.instrument.span('parse.questions', stream=True) as span:
+            self.questions = streamJson(fh, 'questions', addQuestion)
+            span['items'] = len(questions)
+        self.questions['questions'] = questions
         if annotation_file:
             if verbose:
-                print('loading VQA annotations and questions into memory...')
-            self.annotations = json.load(open(annotation_file, 'r'))
-        if question_file:
+                print('streaming VQA annotations and building index...')
+            with openInput(annotation_file) as fh, self.instrument.span('parse.annotations', stream=True) as span:
+                self.annotations = streamJson(fh, 'annotations', addAnnotation)
+                span['items'] = len(annotations)
+            self.annotations['annotations'] = annotations
+        if verbose:
+            print(datetime.datetime.utcnow() - time_t)
+            print('index created!')
+        self._filterIndex = None
+        self._mcIndex = None
+        self.q2a = q2a
+        self.q2q = q2q
+        self.imgToQA = img2QA
+
+    def loadCompact(self, question_file, annotation_file=None, verbose=False):
+        """Stream question and annotation files into an in-memory VQAStore and attach it.
+
+        Records are converted to typed arrays as they are parsed, so neither the whole document
+        nor the dict records are kept. The object behaves like one loaded from fromCache.
+
+        Args:
+            question_file (str): location of VQA question file
+            annotation_file (str, optional): location of VQA annotation file. Defaults to None.
+            verbose (bool, optional): print loading progress. Defaults to False.
+        """
+        time_t = datetime.datetime.utcnow()
+        builder = StoreBuilder()
+        if verbose:
+            print('streaming VQA questions into compact storage...')
+        with openInput(question_file) as fh, self.instrument.span('parse.questions', compact=True) as span:
+            quesMeta = streamJson(fh, 'questions', builder.addQuestion)
+            span['items'] = len(builder.quesIds)
+        annMeta = None
+        if annotation_file:
             if verbose:
-                print('eval mode: loading only VQA questions into memory...')
-            self.questions       = json.load(open(question_file, 'r'))
+                print('streaming VQA annotations into compact storage...')
+            with openInput(annotation_file) as fh, self.instrument.span('parse.annotations', compact=True) as span:
+                annMeta = streamJson(fh, 'annotations', builder.addAnnotation)
+                span['items'] = len(builder.annRows)
+        with self.instrument.span('index.build', items=len(builder.quesIds), compact=True):
+            store = builder.finish(quesMeta, annMeta)
+            del builder
+            self.attachStore(store)
         if verbose:
             print(datetime.datetime.utcnow() - time_t)
-        self.createIndex(verbose)
+            print('index created!')
+
+    @classmethod
+    def fromCache(cls, path, verbose=False, instrument=None):
+        """Create a VQA object from a columnar cache written by saveCache.
+
+        The cache arrays are memory-mapped, so no parsing happens at load time and processes
+        on the same node share the pages. q2q, q2a and imgToQA are read-only mappings that
+        build the records on demand.
+
+        Args:
+            path (str): cache directory
+            verbose (bool, optional): print loading time. Defaults to False.
+            instrument (Instrumentation or callable, optional): receives the spans of the loading and indexing phases. Defaults to None.
+
+        Returns:
+            VQA: VQA object backed by the cache
+        """
+        time_t = datetime.datetime.utcnow()
+        vqa = cls.__new__(cls)
+        vqa.question_file = None
+        vqa.instrument = instrumentation(instrument)
+        with vqa.instrument.span('parse.cache') as span:
+            vqa.attachStore(VQAStore.load(path))
+            span['items'] = len(vqa.store)
+        if verbose:
+            print('cache loaded (t=%0.3fs)'%((datetime.datetime.utcnow() - time_t).total_seconds()))
+        return vqa
+
+    def subset(self, quesIds=None, imgIds=None, quesTypes=[], ansTypes=[]):
+        """Create a view of the questions satisfying all the given conditions, sharing the records of this object.
+
+        The selection is resolved on first use; the view keeps the dataset order. A given empty
+        list of question or image ids selects no question.
+
+        Args:
+            quesIds (list, optional): keep only these question ids. Defaults to None.
+            imgIds (list, optional): keep only the questions of these images. Defaults to None.
+            quesTypes (list, optional): keep only these question types. Defaults to [].
+            ansTypes (list, optional): keep only these answer types. Defaults to [].
+
+        Returns:
+            VQA: view usable as a VQA object, e.g. with getQuesIds, loadQA, loadRes and VQAEval
+        """
+        quesTypes = quesTypes if type(quesTypes) == list else [quesTypes]
+        ansTypes  = ansTypes  if type(ansTypes)  == list else [ansTypes]
+        selection = {'quesIds': quesIds, 'imgIds': imgIds, 'quesTypes': quesTypes, 'ansTypes': ansTypes}
+        return VQA.__new__(VQA).attachView(VQAView([(self, selection)]))
+
+    @staticmethod
+    def concat(*datasets):
+        """Create a view of the questions of several VQA objects, e.g. train and val, sharing their records.
+
+        The datasets must have disjoint question ids, the same task type and either all or none
+        of them annotations.
+
+        Args:
+            *datasets (VQA): objects to concatenate, in order
+
+        Returns:
+            VQA: view usable as a VQA object, e.g. with getQuesIds, loadQA, loadRes and VQAEval
+        """
+        return VQA.__new__(VQA).attachView(VQAView([(vqa, None) for vqa in datasets]))
+
+    def attachView(self, view):
+        """Use a VQAView as the backing storage of this object.
+
+        Args:
+            view (VQAView): selected questions of other VQA objects
+
+        Returns:
+            VQA: this object
+        """
+        self.question_file = None
+        self.instrument  = view.parts[0][0].instrument
+        self.store       = None
+        self.view        = view
+        self.questions   = view.questions()
+        self.annotations = view.annotations()
+        self.qa          = {}
+        self.qqa         = {}
+        self.q2q         = view.map('q2q')
+        self.q2a         = view.map('q2a') if view.annotated else {}
+        self.imgToQA     = view.imageMap()
+        self.questionTypes = None
+        self._filterIndex = None
+        self._mcIndex     = None
+        self._groundTruth = (None, {})
+        return self
+
+    def saveCache(self, path):
+        """Convert the loaded questions and annotations to a columnar cache for VQA.fromCache.
+
+        Args:
+            path (str): output directory
+        """
+        store = self.store if self.store is not None else VQAStore.build(self.questions, self.annotations)
+        store.save(path)
+
+    def attachStore(self, store):
+        """Use a VQAStore as the backing storage of this object.
+
+        Args:
+            store (VQAStore): columnar questions and annotations
+        """
+        self.store       = store
+        self.view        = None
+        self.questions   = store.questions()
+        self.annotations = store.annotations()
+        self.qa          = {}
+        self.qqa         = {}
+        self.q2q         = QuestionMap(store)
+        self.q2a         = AnnotationMap(store)
+        self.imgToQA     = ImageMap(store)
+        self.questionTypes = None
+        self._filterIndex = None
+        self._mcIndex     = None
+        self._groundTruth = (None, {})
 
     def createIndex(self, verbose=False):
         # create index
         if verbose:
             print('creating index...')
-        img2QA      = {ann['image_id']:     [] for ann in self.questions['questions']}
-        q2a       = {ann['question_id']:  [] for ann in self.questions['questions']}
-        q2q       = {ann['question_id']:  [] for ann in self.questions['questions']}
-        if self.annotations:
-            for ann in self.annotations['annotations']:
-                img2QA[ann['image_id']]     += [ann]
-                q2a[ann['question_id']]   = ann
-        for ques in self.questions['questions']:
-            q2q[ques['question_id']]    = ques
+        with self.instrument.span('index.build', items=len(self.questions['questions'])):
+            img2QA      = {ann['image_id']:     [] for ann in self.questions['questions']}
+            q2a       = {ann['question_id']:  [] for ann in self.questions['questions']}
+            q2q       = {ann['question_id']:  [] for ann in self.questions['questions']}
+            if self.annotations:
+                for ann in self.annotations['annotations']:
+                    img2QA[ann['image_id']]     += [ann]
+                    q2a[ann['question_id']]   = ann
+            for ques in self.questions['questions']:
+                q2q[ques['question_id']]    = ques
 
         if verbose: 
             print('index created!')
         # create class members
+        self._filterIndex = None
+        self._mcIndex = None
         self.q2a = q2a
         self.q2q = q2q
         self.imgToQA = img2QA        
 
 
+    def filterIndex(self):
+        """Return the inverted indexes used by getQuesIds and getImgIds, building them on first use.
+
+        The indexes cover the annotations, or the questions when annotations are not loaded; the
+        question types of unannotated questions are the ones set by assignQuestionTypes. The
+        indexes of views are selected from the indexes of their parts.
+
+        Returns:
+            VQAIndex: question_type, answer_type and image_id indexes
+        """
+        if self._filterIndex is None and self.view is not None:
+            with self.instrument.span('index.filter') as span:
+                self._filterIndex = self.view.index(self.questionTypes if not self.annotations else None)
+                span['items'] = len(self._filterIndex.quesIds)
+        if self._filterIndex is None:
+            with self.instrument.span('index.filter') as span:
+                store = self.store
+                if store is not None:
+                    rows = store.annotation_rows if store.hasAnnotations else np.arange(len(store))
+                    quesIds = store.question_id[rows].tolist()
+                    imgIds  = store.image_id[rows].tolist()
+                    quesTypes = ansTypes = None
+                    if self.questionTypes is not None:
+                        quesTypes = [self.questionTypes[quesId] for quesId in quesIds]
+                    if store.hasAnnotations:
+                        strings   = [store.strings[i] for i in range(len(store.strings))] + [None]
+                        quesTypes = [strings[c] for c in store.question_type[rows].tolist()]
+                        ansTypes  = [strings[c] for c in store.answer_type[rows].tolist()]
+                elif self.annotations:
+                    anns      = self.annotations['annotations']
+                    quesIds   = [ann['question_id'] for ann in anns]
+                    imgIds    = [ann['image_id'] for ann in anns]
+                    quesTypes = [ann.get('question_type') for ann in anns]
+                    ansTypes  = [ann.get('answer_type') for ann in anns]
+                else:
+                    ques      = self.questions['questions']
+                    quesIds   = [q['question_id'] for q in ques]
+                    imgIds    = [q['image_id'] for q in ques]
+                    quesTypes = ansTypes = None
+                    if self.questionTypes is not None:
+                        quesTypes = [self.questionTypes[quesId] for quesId in quesIds]
+                self._filterIndex = VQAIndex(quesIds, imgIds, quesTypes, ansTypes)
+                span['items'] = len(quesIds)
+        return self._filterIndex
+
+    def multipleChoiceIndex(self):
+        """Return the coded multiple choices of the questions, building them on first use.
+
+        Returns:
+            MultipleChoiceIndex: choice lookup and per-choice accuracy
+        """
+        if self._mcIndex is None:
+            with self.instrument.span('index.choices', items=len(self.questions['questions'])):
+                self._mcIndex = MultipleChoiceIndex(self)
+        return self._mcIndex
+
+    def groundTruth(self, normalizer=None):
+        """Return the frozen normalized and coded ground truth, building it once per normalizer.
+
+        The snapshot is shared by all the evaluators of this object and is rebuilt only when the
+        annotations are reloaded; the annotation records themselves are never modified.
+
+        Args:
+            normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+
+        Returns:
+            VQAGroundTruth: coded ground truth
+        """
+        normalizer = normalizer if normalizer is not None else defaultNormalizer
+        with _groundTruthLock:
+            index = self.filterIndex()
+            if self._groundTruth[0] is not index:
+                self._groundTruth = (index, {})
+            snapshots = self._groundTruth[1]
+            if normalizer not in snapshots:
+                with self.instrument.span('groundTruth.build') as span:
+                    snapshots[normalizer] = VQAGroundTruth(self, normalizer)
+                    span['items'] = len(snapshots[normalizer])
+            return snapshots[normalizer]
+
+    def assignQuestionTypes(self, classifier=None):
+        """Assign question types to the questions, e.g. for test questions without annotations.
+
+        The types are stored in questionTypes and, when annotations are not loaded, used by
+        getQuesIds(quesTypes=...) and getImgIds(quesTypes=...).
+
+        Args:
+            classifier (QuestionTypeClassifier, optional): classifier. Defaults to the official types of the data_type of the question file.
+
+        Returns:
+            dict: question id -> question type
+        """
+        if classifier is None:
+            classifier = QuestionTypeClassifier.fromDataType(self.questions.get('data_type', 'mscoco'))
+        store = self.store
+        with self.instrument.span('classify.questionTypes') as span:
+            if store is not None:
+                quesIds = store.question_id.tolist()
+                texts   = (store.questionText[row] for row in range(len(store)))
+            else:
+                quesIds = [ques['question_id'] for ques in self.questions['questions']]
+                texts   = (ques['question'] for ques in self.questions['questions'])
+            self.questionTypes = dict(zip(quesIds, classifier.classifyMany(texts)))
+            span['items'] = len(quesIds)
+        self._filterIndex = None
+        return self.questionTypes
+
     def info(self):
         """Print information about the VQA annotation file.
         """
@@ -103,17 +470,7 @@ class VQA:
         quesTypes = quesTypes if type(quesTypes) == list else [quesTypes]
         ansTypes  = ansTypes  if type(ansTypes)  == list else [ansTypes]
 
-        if len(imgIds) == len(quesTypes) == len(ansTypes) == 0:
-            anns = self.annotations['annotations']
-        else:
-            if not len(imgIds) == 0:
-                anns = sum([self.imgToQA[imgId] for imgId in imgIds if imgId in self.imgToQA],[])
-            else:
-                 anns = self.annotations['annotations']
-            anns = anns if len(quesTypes) == 0 else [ann for ann in anns if ann['question_type'] in quesTypes]
-            anns = anns if len(ansTypes)  == 0 else [ann for ann in anns if ann['answer_type'] in ansTypes]
-        ids = [ann['question_id'] for ann in anns]
-        return ids
+        return self.filterIndex().filter(imgIds=imgIds, quesTypes=quesTypes, ansTypes=ansTypes)
 
 
     def getImgIds(self, quesIds=[], quesTypes=[], ansTypes=[]):
@@ -136,17 +493,11 @@ class VQA:
         quesTypes = quesTypes if type(quesTypes) == list else [quesTypes]
         ansTypes  = ansTypes  if type(ansTypes)  == list else [ansTypes]
 
+        index = self.filterIndex()
         if len(quesIds) == len(quesTypes) == len(ansTypes) == 0:
-            anns = self.annotations['annotations']
-        else:
-            if not len(quesIds) == 0:
-                anns = sum([self.qa[quesId] for quesId in quesIds if quesId in self.qa],[])
-            else:
-                anns = self.annotations['annotations']
-            anns = anns if len(quesTypes) == 0 else [ann for ann in anns if ann['question_type'] in quesTypes]
-            anns = anns if len(ansTypes)  == 0 else [ann for ann in anns if ann['answer_type'] in ansTypes]
-        ids = [ann['image_id'] for ann in anns]
-        return ids
+            return list(index.imgIds)
+        q2img = index.q2img
+        return [q2img[quesId] for quesId in index.filter(quesIds=quesIds, quesTypes=quesTypes, ansTypes=ansTypes)]
 
 
     def loadQA(self, ids=[]):
@@ -168,6 +519,63 @@ class VQA:
             return [self.q2a[ids]]
 
 
+    def iterBatches(self, batchSize, rank=0, worldSize=1, workerId=0, numWorkers=1, seed=None, epoch=0,
+                    byImage=False, dropLast=False):
+        """Iterate batches of the records of one shard of the dataset, e.g. for a data loader worker of a distributed job.
+
+        The questions are shuffled with the same seed on every rank and dealt round-robin to the
+        worldSize x numWorkers shards, so shards are disjoint and together cover the dataset. With
+        byImage the shuffled images are first packed into batches, and whole batches are dealt. Only the records of the current batch are built; nothing else is copied.
+        Use workerId and numWorkers of torch.utils.data.get_worker_info() inside dataloader workers.
+
+        Args:
+            batchSize (int): questions per batch
+            rank (int, optional): rank of the process. Defaults to 0.
+            worldSize (int, optional): number of processes. Defaults to 1.
+            workerId (int, optional): data loader worker of the process. Defaults to 0.
+            numWorkers (int, optional): data loader workers per process. Defaults to 1.
+            seed (int, optional): shuffling seed, None to keep the dataset order. Defaults to None.
+            epoch (int, optional): added to the seed, to shuffle differently at every epoch. Defaults to 0.
+            byImage (bool, optional): batch whole images, so that the questions of an image are consecutive in one batch; batches hold at most batchSize questions, except an image with more questions, which makes a batch of its own. Defaults to False.
+            dropLast (bool, optional): give every shard the same number of batches, e.g. for distributed data parallel steps: drop the last incomplete batch and, with byImage, the batches beyond a multiple of the number of shards. Defaults to False.
+
+        Yields:
+            list: annotation records, or question records when annotations are not loaded
+        """
+        assert batchSize > 0, 'batchSize must be positive'
+        assert 0 <= rank < worldSize and 0 <= workerId < numWorkers, 'rank and workerId must be in [0, worldSize) and [0, numWorkers)'
+        index   = self.filterIndex()
+        records = self.q2a if self.annotations else self.q2q
+        units   = list(index.imgToQ) if byImage else index.quesIds
+        nShards = worldSize*numWorkers
+        shardId = rank*numWorkers + workerId
+        order   = np.arange(len(units)) if seed is None else np.random.RandomState(seed + epoch).permutation(len(units))
+        if byImage:
+            # pack whole images into batches the same way on every rank, then deal whole batches,
+            # so that with dropLast every shard makes the same number of steps
+            bounds = []
+            start = size = 0
+            for i, unit in enumerate(order.tolist()):
+                n = len(index.imgToQ[units[unit]])
+                if size and size + n > batchSize:
+                    bounds.append((start, i))
+                    start, size = i, 0
+                size += n
+            if size:
+                bounds.append((start, len(order)))
+            if dropLast:
+                bounds = bounds[:len(bounds) - len(bounds)%nShards]
+            for start, end in bounds[shardId::nShards]:
+                yield [records[quesId] for unit in order[start:end].tolist() for quesId in index.imgToQ[units[unit]]]
+            return
+        nUnits  = len(units) - len(units)%nShards if dropLast else len(units)
+        shard   = order[:nUnits][shardId::nShards].tolist()
+        for start in range(0, len(shard), batchSize):
+            if dropLast and start + batchSize > len(shard):
+                break
+            yield [records[units[unit]] for unit in shard[start:start + batchSize]]
+
+
     def showQA(self, anns):
         """Display the specified annotations.
 
@@ -188,12 +596,35 @@ class VQA:
                 print("Answer %d: %s" %(ans['answer_id'], ans['answer']))
 
 
-    def loadRes(self, resFile, quesFile, verbose=False):
+    def imageLoader(self, imgDir, dataSubType=None, dataType=None, **kwargs):
+        """Create an ImageLoader for the images of this dataset.
+
+        Args:
+            imgDir (str): directory of the images
+            dataSubType (str, optional): data subtype of the file names. Defaults to the data_subtype of the question file.
+            dataType (str, optional): 'mscoco' or 'abstract_v002'. Defaults to the data_type of the question file.
+            **kwargs: workers, cacheBytes, maxSize and decoder of ImageLoader
+
+        Returns:
+            ImageLoader: loader able to prefetch by image or question id
+        """
+        dataSubType = dataSubType if dataSubType is not None else self.questions['data_subtype']
+        dataType    = dataType if dataType is not None else self.questions.get('data_type', 'mscoco')
+        return ImageLoader(imgDir, dataSubType, dataType, q2q=self.q2q, **kwargs)
+
+    def loadRes(self, resFile, quesFile=None, verbose=False):
         """Load result file and return a result object.
 
+        When quesFile is omitted or is the question file this object was loaded from, the result
+        object shares the question index of this object instead of reading it again, and its
+        q2a and imgToQA only cover the predicted questions. Parsing, validation and indexing spans
+        go to the instrumentation of this object, which the result object inherits. Without
+        annotations, results get the question types set by assignQuestionTypes, or None, and no
+        answer type.
+
         Args:
-            resFile (str): file name of result file
-            quesFile (str): file name of question file
+            resFile (str): file name of result file, possibly compressed or in a .zip archive
+            quesFile (str, optional): file name of question file. Defaults to the question file of this object.
 
         Raises:
             NotImplementedError: [description]
@@ -201,7 +632,12 @@ class VQA:
         Returns:
             obj: result api object
         """
-        res = VQA(quesFile)
+        shared = quesFile is None or self.isQuestionFile(quesFile)
+        if shared:
+            res = VQA.__new__(VQA)
+            res.shareQuestions(self)
+        else:
+            res = VQA(quesFile, instrument=self.instrument)
         res.annotations = {}
         res.annotations['info'] = copy.deepcopy(self.questions['info'])
         res.annotations['task_type'] = copy.deepcopy(self.questions['task_type'])
@@ -211,22 +647,82 @@ class VQA:
         if verbose:
             print('Loading and preparing results...     ')
         time_t = datetime.datetime.utcnow()
-        anns    = json.load(open(resFile))
-        assert type(anns) == list, 'results is not an array of objects'
-        annsQuesIds = [ann['question_id'] for ann in anns]
-        assert set(annsQuesIds) == set(self.getQuesIds()), \
-        'Results do not correspond to current VQA set. Either the results do not have predictions for all question ids in annotation file or there is atleast one question id that does not belong to the question ids in the annotation file.'
-        for ann in anns:
-            quesId                  = ann['question_id']
+        with openInput(resFile) as fh, self.instrument.span('parse.results') as span:
+            anns    = json.load(fh)
+            assert type(anns) == list, 'results is not an array of objects'
+            span['items'] = len(anns)
+        index = self.filterIndex()
+        rank  = index.rank
+        with self.instrument.span('validate.results', items=len(anns)):
+            annsQuesIds = set([ann['question_id'] for ann in anns])
+            assert len(annsQuesIds) == len(rank) and all(quesId in rank for quesId in annsQuesIds), \
+            'Results do not correspond to current VQA set. Either the results do not have predictions for all question ids in annotation file or there is atleast one question id that does not belong to the question ids in the annotation file.\n' \
+            + _resultsReport(self, anns)
             if res.annotations['task_type'] == 'Multiple Choice':
-                assert ann['answer'] in self.q2q[quesId]['multiple_choices'], 'predicted answer is not one of the multiple choices'
-            qaAnn                = self.q2a[quesId]
-            ann['image_id']      = qaAnn['image_id']
-            ann['question_type'] = qaAnn['question_type']
-            ann['answer_type']   = qaAnn['answer_type']
+                choices = self.multipleChoiceIndex().choiceIndex([ann['question_id'] for ann in anns],
+                                                                 [ann['answer'] for ann in anns], indices=False)
+                assert np.all(choices >= 0), 'predicted answer is not one of the multiple choices'
+            # without annotations, question types are the ones set by assignQuestionTypes, if any
+            quesTypes = index.quesTypes if index.quesTypes is not None else [None]*len(index.quesIds)
+            ansTypes  = index.ansTypes if index.ansTypes is not None else [None]*len(index.quesIds)
+            for ann in anns:
+                quesId                  = ann['question_id']
+                r                    = rank[quesId]
+                ann['image_id']      = index.imgIds[r]
+                ann['question_type'] = quesTypes[r]
+                ann['answer_type']   = ansTypes[r]
         if verbose:
             print('DONE (t=%0.2fs)'%((datetime.datetime.utcnow() - time_t).total_seconds()))
 
         res.annotations['annotations'] = anns
-        res.createIndex(verbose)
+        if shared:
+            res.indexResults(verbose)
+        else:
+            res.createIndex(verbose)
         return res
+
+    def isQuestionFile(self, quesFile):
+        """Check whether quesFile is the question file this object was loaded from.
+        """
+        return self.question_file is not None and os.path.abspath(quesFile) == os.path.abspath(self.question_file)
+
+    def shareQuestions(self, parent):
+        """Initialize this object with the questions and question index of another VQA object, without copies.
+
+        Args:
+            parent (VQA): object whose questions are shared
+        """
+        self.question_file = parent.question_file
+        self.instrument    = parent.instrument
+        self.questions     = parent.questions
+        self.annotations   = None
+        self.qa            = {}
+        self.qqa           = {}
+        self.store         = None
+        self.view          = None
+        self._filterIndex  = None
+        self._mcIndex      = parent._mcIndex
+        self._groundTruth  = (None, {})
+        self.questionTypes = parent.questionTypes
+        self.q2q           = parent.q2q
+        self.q2a           = {}
+        self.imgToQA       = {}
+
+    def indexResults(self, verbose=False):
+        """Index the annotations of a result object sharing its questions, in time proportional to the number of results.
+        """
+        if verbose:
+            print('creating index...')
+        q2a     = {}
+        img2QA  = {}
+        with self.instrument.span('index.results', items=len(self.annotations['annotations'])):
+            for ann in self.annotations['annotations']:
+                q2a[ann['question_id']] = ann
+                if ann['image_id'] not in img2QA:
+                    img2QA[ann['image_id']] = []
+                img2QA[ann['image_id']].append(ann)
+        if verbose:
+            print('index created!')
+        self._filterIndex = None
+        self.q2a = q2a
+        self.imgToQA = img2QA
@@ -0,0 +1,164 @@
+# coding=utf-8
+
+# Running VQA accuracy over streamed batches of predictions.
+
+# VQAAccumulator scores every batch with the coded ground truth used by
+# VQAEval.evaluatePredictions and keeps only per question type and per answer type running
+# sums, so validation can report accuracy while batches are produced. Partial states of
+# data-parallel ranks can be merged before calling compute.
+
+# The state of an accumulator is a few sums per question type and answer type, so merging
+# ranks is cheap. Samplers of data-parallel jobs (e.g. DistributedSampler) pad their shards
+# with repeated questions, which these sums count twice; with dedupe, a mask and an accuracy
+# of every annotated question are kept instead and repeated questions, within a rank or
+# across merged ranks, are counted once, so the result equals VQAEval.evaluate.
+
+# The following are defined:
+#  VQAAccumulator  - incremental accuracy with update / merge / compute.
+
+import numpy as np
+
+from .vqaResults import EvalResults
+
+
+class VQAAccumulator:
+    def __init__(self, vqa=None, n=2, normalizer=None, perQuestion=False, groundTruth=None, dedupe=False):
+        """Incremental accuracy accumulator.
+
+        Args:
+            vqa (VQA, optional): object with annotations. Not needed if groundTruth is given. Defaults to None.
+            n (int, optional): precision of the accuracies (number of places after decimal). Defaults to 2.
+            normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+            perQuestion (bool, optional): also keep the accuracy of every question in evalQA, as VQAEval.evalQA. Defaults to False.
+            groundTruth (VQAGroundTruth, optional): prebuilt coded ground truth to share. Defaults to None.
+            dedupe (bool, optional): count every question once, keeping the first prediction of repeated question ids. Defaults to False.
+
+        With dedupe, the accumulator keeps one flag and one accuracy per annotated question
+        (9 bytes per question, ~2 MB for VQA v2 val) and state() carries the id and accuracy of
+        every scored question, so its size and the cost of merge grow with the number of
+        questions instead of the number of question and answer types.
+        """
+        assert vqa is not None or groundTruth is not None, 'either vqa or groundTruth must be given'
+        self.n           = n
+        self.groundTruth = groundTruth if groundTruth is not None else vqa.groundTruth(normalizer)
+        self.perQuestion = perQuestion
+        self.dedupe      = dedupe
+        self.reset()
+
+    def reset(self):
+        """Clear the accumulated state.
+        """
+        gt = self.groundTruth
+        self.total        = 0.
+        self.count        = 0
+        self.quesTypeSum  = np.zeros(len(gt.quesTypeNames))
+        self.quesTypeCnt  = np.zeros(len(gt.quesTypeNames), dtype=np.int64)
+        self.ansTypeSum   = np.zeros(len(gt.ansTypeNames))
+        self.ansTypeCnt   = np.zeros(len(gt.ansTypeNames), dtype=np.int64)
+        self.evalQA       = {}
+        self.seen         = np.zeros(len(gt), dtype=bool) if self.dedupe else None
+        self.accs         = np.zeros(len(gt)) if self.dedupe else None
+
+    def _add(self, rows, accs):
+        gt = self.groundTruth
+        if self.dedupe:
+            # first occurrence of every row not seen yet, in batch order
+            _, first = np.unique(rows, return_index=True)
+            keep = np.sort(first[~self.seen[rows[first]]])
+            rows, accs = rows[keep], accs[keep]
+            self.seen[rows] = True
+            self.accs[rows] = accs
+        self.total += float(accs.sum())
+        self.count += len(accs)
+        quesTypes = gt.quesTypeCodes[rows]
+        ansTypes  = gt.ansTypeCodes[rows]
+        self.quesTypeSum += np.bincount(quesTypes, weights=accs, minlength=len(self.quesTypeSum))
+        self.quesTypeCnt += np.bincount(quesTypes, minlength=len(self.quesTypeCnt))
+        self.ansTypeSum  += np.bincount(ansTypes, weights=accs, minlength=len(self.ansTypeSum))
+        self.ansTypeCnt  += np.bincount(ansTypes, minlength=len(self.ansTypeCnt))
+        if self.perQuestion:
+            self.evalQA.update(zip(gt.quesIds[rows].tolist(), [round(100*acc, self.n) for acc in accs.tolist()]))
+
+    def update(self, quesIds, answers, vocab=None):
+        """Score a batch of predictions and add it to the running sums.
+
+        Args:
+            quesIds (sequence): question ids of the batch
+            answers (sequence): answer strings or integer codes, parallel to quesIds
+            vocab (list, optional): strings of integer answer codes. Defaults to None.
+
+        Returns:
+            numpy.ndarray: accuracy in [0, 1] of each prediction of the batch, repeated questions included
+        """
+        gt = self.groundTruth
+        if isinstance(quesIds, np.ndarray):
+            quesIds = quesIds.tolist()
+        rows = gt.rows(quesIds)
+        accs = gt.score(rows, gt.encodeAnswers(answers, vocab))
+        self._add(rows, accs)
+        return accs
+
+    def state(self):
+        """Picklable partial state, e.g. for torch.distributed.all_gather_object.
+
+        Returns:
+            dict: running sums keyed by type name, per-question accuracies if kept and, with dedupe, the scored question ids and their accuracies
+        """
+        gt = self.groundTruth
+        state = {'total': self.total,
+                 'count': self.count,
+                 'perQuestionType': {name: (float(self.quesTypeSum[i]), int(self.quesTypeCnt[i])) for i, name in enumerate(gt.quesTypeNames.strings)},
+                 'perAnswerType': {name: (float(self.ansTypeSum[i]), int(self.ansTypeCnt[i])) for i, name in enumerate(gt.ansTypeNames.strings)},
+                 'evalQA': dict(self.evalQA)}
+        if self.dedupe:
+            rows = np.flatnonzero(self.seen)
+            state['quesIds'] = gt.quesIds[rows].tolist()
+            state['accs']    = self.accs[rows].tolist()
+        return state
+
+    def merge(self, other):
+        """Add the partial state of another accumulator, e.g. from another rank.
+
+        With dedupe, questions already scored by this accumulator are skipped; this needs the
+        state of an accumulator with dedupe.
+
+        Args:
+            other (VQAAccumulator or dict): accumulator or result of state()
+        """
+        if isinstance(other, VQAAccumulator):
+            other = other.state()
+        gt = self.groundTruth
+        if self.dedupe:
+            assert 'quesIds' in other, 'merging into an accumulator with dedupe needs the state of an accumulator with dedupe'
+            self._add(gt.rows(other['quesIds']), np.asarray(other['accs'], dtype=np.float64))
+            return
+        self.total += other['total']
+        self.count += other['count']
+        for name, (total, count) in other['perQuestionType'].items():
+            code = gt.quesTypeNames.codes[name]
+            self.quesTypeSum[code] += total
+            self.quesTypeCnt[code] += count
+        for name, (total, count) in other['perAnswerType'].items():
+            code = gt.ansTypeNames.codes[name]
+            self.ansTypeSum[code] += total
+            self.ansTypeCnt[code] += count
+        self.evalQA.update(other['evalQA'])
+
+    def compute(self):
+        """Accuracy of the predictions accumulated so far.
+
+        Returns:
+            dict: overall, per question type and per answer type accuracy, as VQAEval.accuracy
+        """
+        assert self.count > 0, 'no predictions accumulated'
+        gt = self.groundTruth
+        if self.dedupe:
+            # sums in annotation order, as VQAEval.evaluate
+            rows = np.flatnonzero(self.seen)
+            return EvalResults(gt.quesIds[rows], self.accs[rows], gt.quesTypeCodes[rows], gt.quesTypeNames.strings,
+                               gt.ansTypeCodes[rows], gt.ansTypeNames.strings, self.n).accuracy()
+        return {'overall': round(100*self.total/self.count, self.n),
+                'perQuestionType': {name: round(100*float(self.quesTypeSum[i])/self.quesTypeCnt[i], self.n)
+                                    for i, name in enumerate(gt.quesTypeNames.strings) if self.quesTypeCnt[i]},
+                'perAnswerType': {name: round(100*float(self.ansTypeSum[i])/self.ansTypeCnt[i], self.n)
+                                  for i, name in enumerate(gt.ansTypeNames.strings) if self.ansTypeCnt[i]}}
@@ -0,0 +1,117 @@
+# coding=utf-8
+
+# Evaluation of many runs against one preprocessed ground truth.
+
+# The ground truth is normalized and coded once (VQAGroundTruth, shared through VQA.groundTruth);
+# every run then only costs parsing its predictions, normalizing its answers (memoized) and one
+# vectorized scoring call.
+# Sums are accumulated sequentially in annotation order, so the numbers are identical to
+# VQAEval.evaluate on the same predictions.
+
+# The following are defined:
+#  VQABatchEval  - score result files or prediction arrays and tabulate their accuracy.
+
+import json
+
+import numpy as np
+
+from .vqaGroundTruth import parsePredictions
+from .vqaResults import EvalResults
+from .vqaStream import openInput
+
+
+class VQABatchEval:
+    def __init__(self, vqa=None, n=2, normalizer=None, groundTruth=None):
+        """Batch evaluator sharing one coded ground truth between runs.
+
+        Args:
+            vqa (VQA, optional): object with annotations. Not needed if groundTruth is given. Defaults to None.
+            n (int, optional): precision of the accuracies (number of places after decimal). Defaults to 2.
+            normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+            groundTruth (VQAGroundTruth, optional): prebuilt coded ground truth to share. Defaults to None.
+        """
+        assert vqa is not None or groundTruth is not None, 'either vqa or groundTruth must be given'
+        self.n           = n
+        self.groundTruth = groundTruth if groundTruth is not None else vqa.groundTruth(normalizer)
+
+    def score(self, predictions, answers=None, vocab=None, requireAll=True):
+        """Per-question accuracy of one run.
+
+        Args:
+            predictions: result file name (possibly compressed), dict question id -> answer, list of result objects, or sequence of question ids when answers is given
+            answers (sequence, optional): answer strings or integer codes parallel to predictions. Defaults to None.
+            vocab (list, optional): strings of integer answer codes. Defaults to None.
+            requireAll (bool, optional): require a prediction for every annotated question, as VQA.loadRes. Defaults to True.
+
+        Returns:
+            tuple: (ground truth rows in annotation order, accuracy in [0, 1] of each row)
+        """
+        gt = self.groundTruth
+        if isinstance(predictions, str):
+            with openInput(predictions) as fh:
+                predictions = json.load(fh)
+        quesIds, answers = parsePredictions(predictions, answers)
+        rows = gt.rows(quesIds)
+        assert len(np.unique(rows)) == len(rows), 'predictions contain duplicate question ids'
+        if requireAll:
+            assert len(rows) == len(gt), 'Results do not correspond to current VQA set. Either the results do not have predictions for all question ids in annotation file or there is atleast one question id that does not belong to the question ids in the annotation file.'
+        resCodes = gt.encodeAnswers(answers, vocab)
+        order = np.argsort(rows, kind='stable')
+        rows = rows[order]
+        return rows, gt.score(rows, resCodes[order])
+
+    def accuracy(self, rows, accs):
+        """Overall, per question type and per answer type accuracy of scored rows.
+
+        Args:
+            rows (numpy.ndarray): ground truth rows in annotation order
+            accs (numpy.ndarray): accuracy in [0, 1] of each row
+
+        Returns:
+            dict: same structure as VQAEval.accuracy
+        """
+        gt = self.groundTruth
+        return EvalResults(gt.quesIds[rows], accs, gt.quesTypeCodes[rows], gt.quesTypeNames.strings,
+                           gt.ansTypeCodes[rows], gt.ansTypeNames.strings, self.n).accuracy()
+
+    def evaluate(self, runs, requireAll=True, verbose=False):
+        """Evaluate many runs.
+
+        Args:
+            runs (dict or list): run name -> result file name, predictions or (question ids, answers) tuple; a list of result file names uses them as run names
+            requireAll (bool, optional): require a prediction for every annotated question. Defaults to True.
+            verbose (bool, optional): print the overall accuracy of every run. Defaults to False.
+
+        Returns:
+            dict: run name -> accuracy dict
+        """
+        if not isinstance(runs, dict):
+            runs = {run: run for run in runs}
+        results = {}
+        for name, run in runs.items():
+            if isinstance(run, tuple):
+                rows, accs = self.score(run[0], run[1], requireAll=requireAll)
+            else:
+                rows, accs = self.score(run, requireAll=requireAll)
+            results[name] = self.accuracy(rows, accs)
+            if verbose:
+                print('%s: %.02f' % (name, results[name]['overall']))
+        return results
+
+    @staticmethod
+    def table(results):
+        """Flatten the result of evaluate into one row per run.
+
+        Args:
+            results (dict): run name -> accuracy dict
+
+        Returns:
+            list: dicts with keys run, overall, 'quesType:<type>' and 'ansType:<type>'
+        """
+        rows = []
+        for name, accuracy in results.items():
+            row = {'run': name, 'overall': accuracy['overall']}
+            row.update(('quesType:' + t, acc) for t, acc in accuracy['perQuestionType'].items())
+            row.update(('ansType:' + t, acc) for t, acc in accuracy['perAnswerType'].items())
+            rows.append(row)
+        return rows
@@ -5,151 +5,306 @@ __author__='aagrawal'
 # This code is based on the code written by Tsung-Yi Lin for MSCOCO Python API available at the following link:
 # (https://github.com/tylin/coco-caption/blob/master/pycocoevalcap/eval.py).
 import sys
-import re
+import multiprocessing
+
+import numpy as np
+
+from . import vqaNormalize
+from .vqaNormalize import defaultNormalizer
+from .vqaGroundTruth import parsePredictions
+from .vqaInstrument import instrumentation
+from .vqaResults import EvalResults
+
+# state of the workers of a VQAEval.scoreParallel pool, set by their initializer
+_shared = None
+
+# predictions normalized between two progress updates
+_progressStep = 10000
+
+
+def _initWorker(state):
+    global _shared
+    _shared = state
+
+
+def _scoreShard(bounds):
+    groundTruth, res, quesIds = _shared
+    return groundTruth.score(*_encodeQuestions(groundTruth, res, quesIds[bounds[0]:bounds[1]]))
+
+
+def _encodeQuestions(groundTruth, res, quesIds, progress=None):
+    # ground truth rows and coded normalized predictions; annotations are read from the snapshot
+    rows    = groundTruth.rows(quesIds)
+    answers = [res[quesId]['answer'] for quesId in quesIds]
+    if progress is None:
+        return rows, groundTruth.encodeAnswers(answers)
+    resCodes = []
+    for start in range(0, len(answers), _progressStep):
+        resCodes.append(groundTruth.encodeAnswers(answers[start:start + _progressStep]))
+        progress(min(start + _progressStep, len(answers))/float(len(answers)))
+    return rows, np.concatenate(resCodes) if resCodes else np.zeros(0, dtype=np.int64)
+
 
 class VQAEval:
-    def __init__(self, vqa, vqaRes, n=2):
+    def __init__(self, vqa, vqaRes=None, n=2, normalizer=None, instrument=None):
         self.n               = n
         self.accuracy     = {}
-        self.evalQA       = {}
-        self.evalQuesType = {}
-        self.evalAnsType  = {}
+        self.results      = None
+        self._views       = {}
         self.vqa           = vqa
         self.vqaRes       = vqaRes
         self.params          = {'question_id': vqa.getQuesIds()}
-        self.contractions = {"aint": "ain't", "arent": "aren't", "cant": "can't", "couldve": "could've", "couldnt": "couldn't", \
-                             "couldn'tve": "couldn't've", "couldnt've": "couldn't've", "didnt": "didn't", "doesnt": "doesn't", "dont": "don't", "hadnt": "hadn't", \
-                             "hadnt've": "hadn't've", "hadn'tve": "hadn't've", "hasnt": "hasn't", "havent": "haven't", "hed": "he'd", "hed've": "he'd've", \
-                             "he'dve": "he'd've", "hes": "he's", "howd": "how'd", "howll": "how'll", "hows": "how's", "Id've": "I'd've", "I'dve": "I'd've", \
-                             "Im": "I'm", "Ive": "I've", "isnt": "isn't", "itd": "it'd", "itd've": "it'd've", "it'dve": "it'd've", "itll": "it'll", "let's": "let's", \
-                             "maam": "ma'am", "mightnt": "mightn't", "mightnt've": "mightn't've", "mightn'tve": "mightn't've", "mightve": "might've", \
-                             "mustnt": "mustn't", "mustve": "must've", "neednt": "needn't", "notve": "not've", "oclock": "o'clock", "oughtnt": "oughtn't", \
-                             "ow's'at": "'ow's'at", "'ows'at": "'ow's'at", "'ow'sat": "'ow's'at", "shant": "shan't", "shed've": "she'd've", "she'dve": "she'd've", \
-                             "she's": "she's", "shouldve": "should've", "shouldnt": "shouldn't", "shouldnt've": "shouldn't've", "shouldn'tve": "shouldn't've", \
-                             "somebody'd": "somebodyd", "somebodyd've": "somebody'd've", "somebody'dve": "somebody'd've", "somebodyll": "somebody'll", \
-                             "somebodys": "somebody's", "someoned": "someone'd", "someoned've": "someone'd've", "someone'dve": "someone'd've", \
-                             "someonell": "someone'll", "someones": "someone's", "somethingd": "something'd", "somethingd've": "something'd've", \
-                             "something'dve": "something'd've", "somethingll": "something'll", "thats": "that's", "thered": "there'd", "thered've": "there'd've", \
-                             "there'dve": "there'd've", "therere": "there're", "theres": "there's", "theyd": "they'd", "theyd've": "they'd've", \
-                             "they'dve": "they'd've", "theyll": "they'll", "theyre": "they're", "theyve": "they've", "twas": "'twas", "wasnt": "wasn't", \
-                             "wed've": "we'd've", "we'dve": "we'd've", "weve": "we've", "werent": "weren't", "whatll": "what'll", "whatre": "what're", \
-                             "whats": "what's", "whatve": "what've", "whens": "when's", "whered": "where'd", "wheres": "where's", "whereve": "where've", \
-                             "whod": "who'd", "whod've": "who'd've", "who'dve": "who'd've", "wholl": "who'll", "whos": "who's", "whove": "who've", "whyll": "why'll", \
-                             "whyre": "why're", "whys": "why's", "wont": "won't", "wouldve": "would've", "wouldnt": "wouldn't", "wouldnt've": "wouldn't've", \
-                             "wouldn'tve": "wouldn't've", "yall": "y'all", "yall'll": "y'all'll", "y'allll": "y'all'll", "yall'd've": "y'all'd've", \
-                             "y'alld've": "y'all'd've", "y'all'dve": "y'all'd've", "youd": "you'd", "youd've": "you'd've", "you'dve": "you'd've", \
-                             "youll": "you'll", "youre": "you're", "youve": "you've"}
-        self.manualMap    = { 'none': '0',
-                              'zero': '0',
-                              'one': '1',
-                              'two': '2',
-                              'three': '3',
-                              'four': '4',
-                              'five': '5',
-                              'six': '6',
-                              'seven': '7',
-                              'eight': '8',
-                              'nine': '9',
-                              'ten': '10'
-                            }
-        self.articles     = ['a',
-                             'an',
-                             'the'
-                            ]
-
-
-        self.periodStrip  = re.compile("(?!<=\d)(\.)(?!\d)")
-        self.commaStrip   = re.compile("(\d)(\,)(\d)")
-        self.punct        = [';', r"/", '[', ']', '"', '{', '}',
-                             '(', ')', '=', '+', '\\', '_', '-',
-                             '>', '<', '@', '`', ',', '?', '!']
-
-
-    def evaluate(self, quesIds=None, verbose=False):
+        self.normalizer   = normalizer if normalizer is not None else defaultNormalizer
+        self.contractions = vqaNormalize.contractions
+        self.manualMap    = vqaNormalize.manualMap
+        self.articles     = vqaNormalize.articles
+        self.periodStrip  = vqaNormalize.periodStrip
+        self.commaStrip   = vqaNormalize.commaStrip
+        self.punct        = vqaNormalize.punct
+        self.instrument   = instrumentation(instrument) if instrument is not None else vqa.instrument
+
+
+    def evaluate(self, quesIds=None, verbose=False, workers=1):
+        """Compute the accuracy of the results.
+
+        Ground truth answers are read from the frozen snapshot of vqa.groundTruth, so the
+        annotations of vqa are left untouched and evaluating again, or from other evaluators
+        sharing vqa, gives the same numbers without normalizing the ground truth again.
+
+        Args:
+            quesIds (list, optional): question ids to evaluate. Defaults to all the question ids in the annotation file.
+            verbose (bool, optional): print progress information. Defaults to False.
+            workers (int, optional): number of processes scoring shards of quesIds. Defaults to 1.
+
+        Returns:
+            dict: overall, per question type and per answer type accuracy
+        """
         if quesIds == None:
             quesIds = [quesId for quesId in self.params['question_id']]
-        gts = {}
-        res = {}
-        for quesId in quesIds:
-            gts[quesId] = self.vqa.q2a[quesId]
-            res[quesId] = self.vqaRes.q2a[quesId]
+        gt = self.groundTruth()
 
         # =================================================
         # Compute accuracy
         # =================================================
-        accQA       = []
-        accQuesType = {}
-        accAnsType  = {}
         if verbose:
             print("computing accuracy")
-        step = 0
-        for quesId in quesIds:
-            resAns      = res[quesId]['answer']
-            resAns      = resAns.replace('\n', ' ')
-            resAns      = resAns.replace('\t', ' ')
-            resAns      = resAns.strip()
-            resAns      = self.processPunctuation(resAns)
-            resAns      = self.processDigitArticle(resAns)
-            gtAcc  = []
-            gtAnswers = [ans['answer'] for ans in gts[quesId]['answers']]
-            if len(set(gtAnswers)) > 1:
-                for ansDic in gts[quesId]['answers']:
-                    ansDic['answer'] = self.processPunctuation(ansDic['answer'])
-            for gtAnsDatum in gts[quesId]['answers']:
-                otherGTAns = [item for item in gts[quesId]['answers'] if item!=gtAnsDatum]
-                matchingAns = [item for item in otherGTAns if item['answer']==resAns]
-                acc = min(1, float(len(matchingAns))/3)
-                gtAcc.append(acc)
-            quesType    = gts[quesId]['question_type']
-            ansType     = gts[quesId]['answer_type']
-            avgGTAcc = float(sum(gtAcc))/len(gtAcc)
-            accQA.append(avgGTAcc)
-            if quesType not in accQuesType:
-                accQuesType[quesType] = []
-            accQuesType[quesType].append(avgGTAcc)
-            if ansType not in accAnsType:
-                accAnsType[ansType] = []
-            accAnsType[ansType].append(avgGTAcc)
-            self.setEvalQA(quesId, avgGTAcc)
-            self.setEvalQuesType(quesId, quesType, avgGTAcc)
-            self.setEvalAnsType(quesId, ansType, avgGTAcc)
-            if step%100 == 0 and verbose:
-                self.updateProgress(step/float(len(quesIds)))
-            step = step + 1
-
-        self.setAccuracy(accQA, accQuesType, accAnsType)
+        instrument = self.instrument
+        if workers > 1:
+            with instrument.span('normalize+score', items=len(quesIds), workers=workers):
+                accs = self.scoreParallel(quesIds, workers, verbose)
+        else:
+            with instrument.span('normalize', items=len(quesIds)):
+                rows, resCodes = _encodeQuestions(gt, self.vqaRes.q2a, quesIds, self.updateProgress if verbose else None)
+            with instrument.span('score', items=len(quesIds)):
+                accs = gt.score(rows, resCodes)
+        index = self.vqa.filterIndex()
+        with instrument.span('aggregate', items=len(quesIds)):
+            rows  = [index.rank[quesId] for quesId in quesIds]
+            quesTypes = [index.quesTypes[row] for row in rows]
+            ansTypes  = [index.ansTypes[row] for row in rows]
+            self.aggregate(quesIds, accs, quesTypes, ansTypes)
+        if verbose:
+            print("Done computing accuracy")
+        return {'overall': self.accuracy['overall'],
+                'perQuestionType': self.accuracy['perQuestionType'],
+                'perAnswerType': self.accuracy['perAnswerType']}
+
+    def evaluatePredictions(self, predictions, answers=None, vocab=None, verbose=False):
+        """Compute the accuracy of in-memory predictions, without result files or result objects.
+
+        Predictions are scored in annotation order, so evaluating predictions for all the
+        questions gives the same numbers as evaluate.
+
+        Args:
+            predictions: dict question id -> answer, list of {'question_id', 'answer'} dicts, or sequence of question ids when answers is given
+            answers (sequence, optional): answer strings or integer codes parallel to predictions. Defaults to None.
+            vocab (list, optional): strings of integer answer codes. Without it integer answers are codes of groundTruth().codebook. Defaults to None.
+            verbose (bool, optional): print progress information. Defaults to False.
+
+        Returns:
+            dict: overall, per question type and per answer type accuracy
+        """
+        instrument = self.instrument
+        gt = self.groundTruth()
+        with instrument.span('validate.results') as span:
+            quesIds, answers = parsePredictions(predictions, answers)
+            rows = gt.rows(quesIds)
+            assert len(np.unique(rows)) == len(rows), 'predictions contain duplicate question ids'
+            span['items'] = len(rows)
+        with instrument.span('normalize', items=len(rows)):
+            resCodes = gt.encodeAnswers(answers, vocab)
+        order = np.argsort(rows, kind='stable')
+        rows, resCodes = rows[order], resCodes[order]
+        if verbose:
+            print("computing accuracy")
+        with instrument.span('score', items=len(rows)):
+            accs = gt.score(rows, resCodes)
+        with instrument.span('aggregate', items=len(rows)):
+            self.setResults(EvalResults(gt.quesIds[rows], accs, gt.quesTypeCodes[rows], gt.quesTypeNames.strings,
+                                        gt.ansTypeCodes[rows], gt.ansTypeNames.strings, self.n))
         if verbose:
             print("Done computing accuracy")
         return {'overall': self.accuracy['overall'],
                 'perQuestionType': self.accuracy['perQuestionType'],
                 'perAnswerType': self.accuracy['perAnswerType']}
 
+    def evaluateMultipleChoice(self, predictions, answers=None, verbose=False):
+        """Compute the accuracy of Multiple Choice predictions given as choice strings or choice indices.
+
+        The accuracy of every choice of every question is computed once (vectorized) and
+        cached, so scoring a run only validates and indexes its predictions. Predicted strings
+        must be exactly one of the choices of their question, as in VQA.loadRes.
+
+        Args:
+            predictions: dict question id -> answer, list of {'question_id', 'answer'} dicts, or sequence of question ids when answers is given
+            answers (sequence, optional): choice strings or integer choice indices parallel to predictions. Defaults to None.
+            verbose (bool, optional): print progress information. Defaults to False.
+
+        Returns:
+            dict: overall, per question type and per answer type accuracy
+        """
+        instrument = self.instrument
+        gt = self.groundTruth()
+        mc = self.vqa.multipleChoiceIndex()
+        with instrument.span('validate.results') as span:
+            quesIds, answers = parsePredictions(predictions, answers)
+            rows = gt.rows(quesIds)
+            assert len(np.unique(rows)) == len(rows), 'predictions contain duplicate question ids'
+            choices = mc.choiceIndex(quesIds, answers)
+            assert np.all(choices >= 0), 'predicted answer is not one of the multiple choices'
+            span['items'] = len(rows)
+        if verbose:
+            print("computing accuracy")
+        with instrument.span('score.choices', items=len(gt)):
+            scores = mc.choiceScores(gt)
+        order = np.argsort(rows, kind='stable')
+        rows, choices = rows[order], choices[order]
+        with instrument.span('score', items=len(rows)):
+            accs = scores[rows, choices]
+        with instrument.span('aggregate', items=len(rows)):
+            self.setResults(EvalResults(gt.quesIds[rows], accs, gt.quesTypeCodes[rows], gt.quesTypeNames.strings,
+                                        gt.ansTypeCodes[rows], gt.ansTypeNames.strings, self.n))
+        if verbose:
+            print("Done computing accuracy")
+        return {'overall': self.accuracy['overall'],
+                'perQuestionType': self.accuracy['perQuestionType'],
+                'perAnswerType': self.accuracy['perAnswerType']}
+
+    def groundTruth(self):
+        """Return the frozen normalized and coded ground truth of vqa, shared with the other evaluators of vqa.
+
+        Returns:
+            VQAGroundTruth: coded ground truth
+        """
+        return self.vqa.groundTruth(self.normalizer)
+
+    def aggregate(self, quesIds, accs, quesTypes, ansTypes):
+        """Fill results, accuracy and the evalQA, evalQuesType, evalAnsType views from per-question accuracies.
+
+        Args:
+            quesIds (list): question ids
+            accs (list): accuracy in [0, 1] of each question
+            quesTypes (list): question type of each question
+            ansTypes (list): answer type of each question
+        """
+        self.setResults(EvalResults.fromLabels(quesIds, accs, quesTypes, ansTypes, self.n))
+
+    def setResults(self, results):
+        """Use per-question results; evalQA, evalQuesType and evalAnsType are built from them on first access.
+
+        Args:
+            results (EvalResults): per-question results
+        """
+        self.results  = results
+        self._views   = {}
+        self.accuracy.update(results.accuracy())
+
+    def _view(self, name):
+        if name not in self._views:
+            self._views[name] = getattr(self.results, name) if self.results is not None else {}
+        return self._views[name]
+
+    @property
+    def evalQA(self):
+        return self._view('evalQA')
+
+    @evalQA.setter
+    def evalQA(self, value):
+        self._views['evalQA'] = value
+
+    @property
+    def evalQuesType(self):
+        return self._view('evalQuesType')
+
+    @evalQuesType.setter
+    def evalQuesType(self, value):
+        self._views['evalQuesType'] = value
+
+    @property
+    def evalAnsType(self):
+        return self._view('evalAnsType')
+
+    @evalAnsType.setter
+    def evalAnsType(self, value):
+        self._views['evalAnsType'] = value
+
+    def saveResults(self, path, fileType=None):
+        """Write the results of the last evaluation without building the evalQA, evalQuesType, evalAnsType dicts.
+
+        Args:
+            path (str): output file name; the format is taken from its extension (.json, .csv or .npz)
+            fileType (str, optional): for .json, 'accuracy', 'evalQA', 'evalQuesType' or 'evalAnsType'. Defaults to 'evalQA'.
+        """
+        assert self.results is not None, 'nothing evaluated yet'
+        extension = path.rsplit('.', 1)[-1].lower()
+        assert extension in ('json', 'csv', 'npz'), 'unknown result format %s' % extension
+        if extension == 'json':
+            self.results.saveJson(path, fileType or 'evalQA')
+        elif extension == 'csv':
+            self.results.saveCsv(path)
+        else:
+            self.results.saveNpz(path)
+
+    def scoreParallel(self, quesIds, workers, verbose=False):
+        """Score the given questions with a process pool.
+
+        quesIds is split in contiguous shards and the per-question accuracies are merged back
+        in order, so the result is identical to the sequential evaluation. The ground truth
+        snapshot and the results are inherited by forked workers; where fork is not available
+        they are sent once per worker, never once per shard.
+
+        Args:
+            quesIds (list): question ids to score
+            workers (int): number of processes
+            verbose (bool, optional): print progress information. Defaults to False.
+
+        Returns:
+            numpy.ndarray: accuracy in [0, 1] of each question
+        """
+        state = (self.groundTruth(), self.vqaRes.q2a, quesIds)
+        nShards = min(len(quesIds), 4*workers) or 1
+        bounds = [(len(quesIds)*i//nShards, len(quesIds)*(i+1)//nShards) for i in range(nShards)]
+        if 'fork' in multiprocessing.get_all_start_methods():
+            context = multiprocessing.get_context('fork')
+        else:
+            context = multiprocessing.get_context()
+        accs = []
+        done = 0
+        # state goes to the workers of this pool only (inherited, not pickled, under fork), so
+        # concurrent evaluations in other threads cannot see or clear it
+        with context.Pool(workers, initializer=_initWorker, initargs=(state,)) as pool:
+            for shard in pool.imap(_scoreShard, bounds):
+                accs.append(shard)
+                done += len(shard)
+                if verbose:
+                    self.updateProgress(done/float(len(quesIds)))
+        return np.concatenate(accs) if accs else np.zeros(0)
+
     def processPunctuation(self, inText):
-        outText = inText
-        for p in self.punct:
-            if (p + ' ' in inText or ' ' + p in inText) or (re.search(self.commaStrip, inText) != None):
-                outText = outText.replace(p, '')
-            else:
-                outText = outText.replace(p, ' ')
-        outText = self.periodStrip.sub("",
-                                      outText,
-                                      re.UNICODE)
-        return outText
+        return self.normalizer.processPunctuation(inText)
 
     def processDigitArticle(self, inText):
-        outText = []
-        tempText = inText.lower().split()
-        for word in tempText:
-            word = self.manualMap.setdefault(word, word)
-            if word not in self.articles:
-                outText.append(word)
-            else:
-                pass
-        for wordId, word in enumerate(outText):
-            if word in self.contractions:
-                outText[wordId] = self.contractions[word]
-        outText = ' '.join(outText)
-        return outText
+        return self.normalizer.processDigitArticle(inText)
 
     def setAccuracy(self, accQA, accQuesType, accAnsType):
         self.accuracy['overall']         = round(100*float(sum(accQA))/len(accQA), self.n)
@@ -0,0 +1,154 @@
+# coding=utf-8
+
+# Ground truth answers of a VQA object, normalized and integer-coded once.
+
+# Ground truth answers are normalized with the rules of VQAEval.evaluate (punctuation is
+# processed only when the answers of a question disagree) and coded with an AnswerCodebook.
+# Predictions are normalized with the same engine and looked up in the codebook, so a whole
+# split is scored with vqaScore.scoreCodes without building result objects.
+
+# The ground truth is a frozen snapshot: it is built once, its arrays are read-only and it never
+# writes to the annotations of the VQA object, so any number of evaluators, in threads or
+# processes, can share it without copies or locks. VQA.groundTruth caches one per normalizer.
+
+# The following are defined:
+#  VQAGroundTruth   - coded ground truth answers and types of the annotated questions.
+#  parsePredictions - split predictions given in any supported layout into ids and answers.
+
+import numpy as np
+
+from .vqaNormalize import defaultNormalizer
+from .vqaScore import AnswerCodebook, scoreCodes
+
+
+def parsePredictions(predictions, answers=None):
+    """Split predictions into question ids and answers.
+
+    Args:
+        predictions: dict question id -> answer, list of {'question_id', 'answer'} dicts, or sequence of question ids when answers is given
+        answers (sequence, optional): answers parallel to the question ids in predictions. Defaults to None.
+
+    Returns:
+        tuple: (list of question ids, sequence of answers)
+    """
+    if answers is not None:
+        quesIds = predictions.tolist() if isinstance(predictions, np.ndarray) else list(predictions)
+        assert len(quesIds) == len(answers), 'question ids and answers must have the same length'
+        return quesIds, answers
+    if isinstance(predictions, dict):
+        return list(predictions.keys()), list(predictions.values())
+    assert type(predictions) == list, 'predictions must be a dict, a list of objects or parallel arrays'
+    return [ann['question_id'] for ann in predictions], [ann['answer'] for ann in predictions]
+
+
+class VQAGroundTruth:
+    def __init__(self, vqa, normalizer=None):
+        """Frozen, normalized and integer-coded ground truth of the annotated questions of a VQA object.
+
+        Args:
+            vqa (VQA): object with annotations
+            normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+        """
+        assert vqa.annotations, 'Annotations not available!'
+        self.normalizer = normalizer if normalizer is not None else defaultNormalizer
+        index = vqa.filterIndex()
+        self.rank      = index.rank
+        self.quesIds   = np.asarray(index.quesIds, dtype=np.int64)
+        self.codebook  = AnswerCodebook()
+        self.quesTypeNames = AnswerCodebook()
+        self.ansTypeNames  = AnswerCodebook()
+        self.quesTypeCodes = self.quesTypeNames.encode(index.quesTypes, grow=True).astype(np.int32)
+        self.ansTypeCodes  = self.ansTypeNames.encode(index.ansTypes, grow=True).astype(np.int32)
+        if vqa.store is not None:
+            self.gtCodes = self._encodeStore(vqa.store)
+        else:
+            self.gtCodes = self._encodeRecords(vqa.q2a, index.quesIds)
+        for array in (self.quesIds, self.quesTypeCodes, self.ansTypeCodes, self.gtCodes):
+            array.setflags(write=False)
+        self._frozen = True
+
+    def __setattr__(self, name, value):
+        assert not getattr(self, '_frozen', False), 'VQAGroundTruth is immutable'
+        object.__setattr__(self, name, value)
+
+    def _encodeRecords(self, q2a, quesIds):
+        processPunctuation = self.normalizer.processPunctuation
+        add = self.codebook.add
+        rows = []
+        for quesId in quesIds:
+            gtAnswers = [ans['answer'] for ans in q2a[quesId]['answers']]
+            if len(set(gtAnswers)) > 1:
+                gtAnswers = [processPunctuation(ans) for ans in gtAnswers]
+            rows.append([add(ans) for ans in gtAnswers])
+        width = max([len(row) for row in rows] or [0])
+        gtCodes = np.full((len(rows), width), -1, dtype=np.int32)
+        for i, row in enumerate(rows):
+            gtCodes[i, :len(row)] = row
+        return gtCodes
+
+    def _encodeStore(self, store):
+        # map the store string table to raw and punctuation-processed codes once, then
+        # choose per question depending on whether its answers agree
+        raw = np.asarray(store.answers[store.annotation_rows])
+        valid = raw >= 0
+        used = np.unique(raw[valid]).tolist()
+        rawMap  = np.full(len(store.strings) + 1, -1, dtype=np.int32)
+        normMap = np.full(len(store.strings) + 1, -1, dtype=np.int32)
+        for c in used:
+            rawMap[c]  = self.codebook.add(store.strings[c])
+            normMap[c] = self.codebook.add(self.normalizer.processPunctuation(store.strings[c]))
+        agree = np.all((raw == raw[:, :1]) | ~valid, axis=1)
+        return np.where(agree[:, None], rawMap[raw], normMap[raw])
+
+    def __len__(self):
+        return len(self.quesIds)
+
+    def rows(self, quesIds):
+        """Rows of the given question ids.
+
+        Args:
+            quesIds (list): annotated question ids
+
+        Returns:
+            numpy.ndarray: int64 rows
+        """
+        rank = self.rank
+        unknown = [quesId for quesId in quesIds if quesId not in rank]
+        assert not unknown, 'question ids not in the annotations, e.g. %s' % unknown[:5]
+        return np.fromiter((rank[quesId] for quesId in quesIds), dtype=np.int64, count=len(quesIds))
+
+    def encodeAnswers(self, answers, vocab=None):
+        """Normalize and code predicted answers.
+
+        Args:
+            answers (sequence): answer strings, or integer answer codes
+            vocab (list, optional): strings of integer answer codes. Without it integer answers are codebook codes. Defaults to None.
+
+        Returns:
+            numpy.ndarray: codebook codes, -1 for answers that never match, including negative integer codes
+        """
+        normalize = self.normalizer.normalize
+        if not isinstance(answers, np.ndarray) and len(answers) and isinstance(answers[0], (int, np.integer)):
+            answers = np.asarray(answers, dtype=np.int64)
+        if isinstance(answers, np.ndarray) and answers.dtype.kind in 'iu':
+            if vocab is None:
+                return answers.astype(np.int64)
+            assert not len(answers) or answers.max() < len(vocab), 'answer code %d out of the vocabulary of %d answers' % (answers.max(), len(vocab))
+            lookup = self.codebook.encode([normalize(s) for s in vocab])
+            # negative (sentinel) codes never match, instead of indexing from the end of lookup
+            return np.where(answers >= 0, lookup[np.maximum(answers, 0)], -1)
+        if isinstance(answers, np.ndarray):
+            answers = answers.tolist()
+        return self.codebook.encode([normalize(ans) for ans in answers])
+
+    def score(self, rows, resCodes):
+        """Accuracy of coded predictions.
+
+        Args:
+            rows (numpy.ndarray): ground truth rows
+            resCodes (numpy.ndarray): codebook codes of the predictions
+
+        Returns:
+            numpy.ndarray: accuracy in [0, 1] of each prediction
+        """
+        return scoreCodes(self.gtCodes[rows], resCodes)
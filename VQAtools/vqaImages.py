@@ -0,0 +1,237 @@
+# coding=utf-8
+
+# Image access for browsing VQA questions and answers.
+
+# ImageLoader maps image ids to file names of the mscoco and abstract_v002 layouts, decodes
+# images in a thread pool (file reads and JPEG/PNG decoding release the GIL) and keeps the
+# decoded, optionally downscaled, images in an LRU cache bounded by size in bytes. Prefetching
+# the images of the next questions hides the decoding latency of review tools built on showQA.
+# Decoding uses Pillow, or scikit-image when Pillow is not installed.
+
+# Example usage:
+#     loader = vqa.imageLoader('../Images/mscoco/val2014/', maxSize=512)
+#     loader.prefetch(quesIds=quesIds[:64])
+#     plt.imshow(loader.get(vqa.q2q[quesIds[0]]['image_id']))
+
+# The following are defined:
+#  ImageLoader  - image id to path mapping, threaded prefetch and LRU cache of decoded images.
+#  imageFileName - file name of an image in the official layouts.
+
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+_layouts = {'mscoco': 'COCO_%s_%012d.jpg',
+            'abstract_v002': 'abstract_v002_%s_%012d.png'}
+
+
+def imageFileName(imgId, dataSubType, dataType='mscoco'):
+    """File name of an image, e.g. COCO_val2014_000000000042.jpg.
+
+    Args:
+        imgId (int): image id
+        dataSubType (str): e.g. 'train2014', 'val2014' or 'train2015' for abstract scenes
+        dataType (str, optional): 'mscoco' or 'abstract_v002'. Defaults to 'mscoco'.
+
+    Returns:
+        str: file name
+    """
+    assert dataType in _layouts, 'unknown data type %s' % dataType
+    return _layouts[dataType] % (dataSubType, imgId)
+
+
+def _decode(path, maxSize=None):
+    try:
+        from PIL import Image
+    except ImportError:
+        Image = None
+    if Image is not None:
+        with Image.open(path) as img:
+            if maxSize is not None:
+                img.draft('RGB', (maxSize, maxSize))
+                img.thumbnail((maxSize, maxSize))
+            return np.asarray(img.convert('RGB'))
+    try:
+        import skimage.io
+    except ImportError:
+        raise ImportError('decoding images requires Pillow or scikit-image')
+    return _downscale(skimage.io.imread(path), maxSize)
+
+
+def _downscale(image, maxSize):
+    # integer stride subsampling, for decoders that cannot downscale
+    if maxSize is None or max(image.shape[:2]) <= maxSize:
+        return image
+    step = -(-max(image.shape[:2])//maxSize)
+    return np.ascontiguousarray(image[::step, ::step])
+
+
+class ImageLoader:
+    def __init__(self, imgDir, dataSubType, dataType='mscoco', workers=8, cacheBytes=512*2**20, maxSize=None,
+                 decoder=None, q2q=None):
+        """Image loader with threaded prefetch and a decoded image cache.
+
+        Args:
+            imgDir (str): directory of the images
+            dataSubType (str): data subtype used in the file names, e.g. 'val2014'
+            dataType (str, optional): 'mscoco' or 'abstract_v002'. Defaults to 'mscoco'.
+            workers (int, optional): decoding threads. Defaults to 8.
+            cacheBytes (int, optional): maximum total size of the cached images. Defaults to 512 MB.
+            maxSize (int, optional): downscale images so that their longest side is at most maxSize pixels. Defaults to None.
+            decoder (callable, optional): path -> numpy image, replacing Pillow/scikit-image; its output is downscaled by striding. Defaults to None.
+            q2q (Mapping, optional): question id -> question record, to prefetch by question id. Defaults to None.
+        """
+        assert dataType in _layouts, 'unknown data type %s' % dataType
+        self.imgDir      = imgDir
+        self.dataSubType = dataSubType
+        self.dataType    = dataType
+        self.cacheBytes  = cacheBytes
+        self.maxSize     = maxSize
+        self.decoder     = decoder
+        self.q2q         = q2q
+        self.workers     = workers
+        self._pool       = None
+        self._cache      = OrderedDict()
+        self._cachedBytes = 0
+        self._pending    = {}
+        self._lock       = threading.Lock()
+        self.hits        = 0
+        self.misses      = 0
+
+    def path(self, imgId):
+        """Path of an image.
+        """
+        return os.path.join(self.imgDir, imageFileName(imgId, self.dataSubType, self.dataType))
+
+    def imageIds(self, quesIds):
+        """Image ids of question ids, in order.
+        """
+        assert self.q2q is not None, 'question ids need the q2q mapping of a VQA object'
+        return [self.q2q[quesId]['image_id'] for quesId in quesIds]
+
+    def load(self, imgId):
+        """Decode an image, without the cache.
+        """
+        if self.decoder is not None:
+            return _downscale(self.decoder(self.path(imgId)), self.maxSize)
+        return _decode(self.path(imgId), self.maxSize)
+
+    def _store(self, imgId, image):
+        with self._lock:
+            self._pending.pop(imgId, None)
+            if imgId in self._cache or image.nbytes > self.cacheBytes:
+                return
+            self._cache[imgId] = image
+            self._cachedBytes += image.nbytes
+            while self._cachedBytes > self.cacheBytes:
+                _, evicted = self._cache.popitem(last=False)
+                self._cachedBytes -= evicted.nbytes
+
+    def _loadAndStore(self, imgId):
+        try:
+            image = self.load(imgId)
+        except BaseException:
+            with self._lock:
+                self._pending.pop(imgId, None)
+            raise
+        self._store(imgId, image)
+        return image
+
+    def _submit(self, imgId):
+        # future of an image not in the cache, shared with earlier requests; lock held by the caller
+        future = self._pending.get(imgId)
+        if future is None:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(self.workers)
+            future = self._pending[imgId] = self._pool.submit(self._loadAndStore, imgId)
+        return future
+
+    def prefetch(self, imgIds=None, quesIds=None):
+        """Start decoding images in the background.
+
+        Args:
+            imgIds (list, optional): image ids. Defaults to None.
+            quesIds (list, optional): question ids whose images are prefetched. Defaults to None.
+
+        Returns:
+            int: number of images scheduled (not already cached or pending)
+        """
+        imgIds = (list(imgIds) if imgIds is not None else []) + (self.imageIds(quesIds) if quesIds is not None else [])
+        scheduled = 0
+        with self._lock:
+            for imgId in dict.fromkeys(imgIds):
+                if imgId not in self._cache and imgId not in self._pending:
+                    self._submit(imgId)
+                    scheduled += 1
+        return scheduled
+
+    def get(self, imgId):
+        """Decoded image, from the cache, a pending prefetch or decoded now.
+
+        Args:
+            imgId (int): image id
+
+        Returns:
+            numpy.ndarray: H x W x C image
+        """
+        with self._lock:
+            image = self._cache.get(imgId)
+            if image is not None:
+                self._cache.move_to_end(imgId)
+                self.hits += 1
+                return image
+            self.misses += 1
+            future = self._pending.get(imgId)
+        if future is not None:
+            return future.result()
+        return self._loadAndStore(imgId)
+
+    def iterImages(self, imgIds=None, quesIds=None, ahead=None):
+        """Iterate (image id, image) in order, prefetching the following images.
+
+        Args:
+            imgIds (list, optional): image ids. Defaults to None.
+            quesIds (list, optional): question ids, their images are yielded instead. Defaults to None.
+            ahead (int, optional): images decoded ahead of the current one. Defaults to 2 x workers.
+
+        Yields:
+            tuple: (image id, numpy.ndarray)
+        """
+        imgIds = list(imgIds) if imgIds is not None else self.imageIds(quesIds or [])
+        ahead = 2*self.workers if ahead is None else ahead
+        self.prefetch(imgIds[:ahead])
+        for i, imgId in enumerate(imgIds):
+            if i + ahead < len(imgIds):
+                self.prefetch(imgIds[i + ahead:i + ahead + 1])
+            yield imgId, self.get(imgId)
+
+    def cacheInfo(self):
+        """Cache statistics: hits, misses, number of images, bytes and capacity.
+        """
+        with self._lock:
+            return {'hits': self.hits, 'misses': self.misses, 'images': len(self._cache),
+                    'bytes': self._cachedBytes, 'capacity': self.cacheBytes, 'pending': len(self._pending)}
+
+    def clearCache(self):
+        """Drop the cached images.
+        """
+        with self._lock:
+            self._cache.clear()
+            self._cachedBytes = 0
+
+    def close(self):
+        """Stop the decoding threads.
+        """
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
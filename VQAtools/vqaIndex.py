@@ -0,0 +1,92 @@
+# coding=utf-8
+
+# Inverted indexes used to answer VQA.getQuesIds and VQA.getImgIds filters.
+
+# Every filter is resolved from the smallest candidate list (given question ids, the
+# questions of the given images, or the questions of the given types) and the remaining
+# conditions are checked per candidate, so a compound filter costs time proportional to the
+# candidates instead of a scan of the whole dataset.
+
+# The following are defined:
+#  VQAIndex  - question_type, answer_type and image_id inverted indexes.
+
+
+class VQAIndex:
+    def __init__(self, quesIds, imgIds, quesTypes=None, ansTypes=None):
+        """Inverted indexes over a list of questions, in dataset order.
+
+        Args:
+            quesIds (list): question ids
+            imgIds (list): image id of each question
+            quesTypes (list, optional): question type of each question, None if not available. Defaults to None.
+            ansTypes (list, optional): answer type of each question, None if not available. Defaults to None.
+        """
+        self.quesIds     = quesIds
+        self.imgIds      = imgIds
+        self.quesTypes   = quesTypes
+        self.ansTypes    = ansTypes
+        self.rank        = {quesId: i for i, quesId in enumerate(quesIds)}
+        self.q2img       = dict(zip(quesIds, imgIds))
+        self.imgToQ      = self._group(imgIds)
+        self.quesTypeToQ = self._group(quesTypes) if quesTypes is not None else {}
+        self.ansTypeToQ  = self._group(ansTypes) if ansTypes is not None else {}
+
+    def _group(self, keys):
+        groups = {}
+        for quesId, key in zip(self.quesIds, keys):
+            if key not in groups:
+                groups[key] = []
+            groups[key].append(quesId)
+        return groups
+
+    def _union(self, index, keys):
+        lists = [index[key] for key in set(keys) if key in index]
+        if len(lists) == 1:
+            return list(lists[0])
+        return sorted([quesId for ids in lists for quesId in ids], key=self.rank.__getitem__)
+
+    def filter(self, quesIds=None, imgIds=None, quesTypes=[], ansTypes=[]):
+        """Question ids satisfying all the given conditions. Empty or None conditions are skipped.
+
+        Args:
+            quesIds (list, optional): keep only these question ids, in this order. Defaults to None.
+            imgIds (list, optional): keep only the questions of these images, in image order. Defaults to None.
+            quesTypes (list, optional): keep only these question types. Defaults to [].
+            ansTypes (list, optional): keep only these answer types. Defaults to [].
+
+        Returns:
+            list: question ids, in dataset order unless quesIds or imgIds are given
+        """
+        if quesIds:
+            candidates = [quesId for quesId in quesIds if quesId in self.rank]
+            if imgIds:
+                imgIds = set(imgIds)
+                candidates = [quesId for quesId in candidates if self.q2img[quesId] in imgIds]
+        elif imgIds:
+            candidates = [quesId for imgId in imgIds for quesId in self.imgToQ.get(imgId, [])]
+        else:
+            candidates = None
+        if quesTypes:
+            assert self.quesTypes is not None, 'Question types are not available, you cannot specify quesTypes for filtering'
+        if ansTypes:
+            assert self.ansTypes is not None, 'Annotations are not available, you cannot specify ansTypes for filtering'
+
+        if candidates is None:
+            if not quesTypes and not ansTypes:
+                return list(self.quesIds)
+            nQues = sum(len(self.quesTypeToQ.get(t, [])) for t in set(quesTypes)) if quesTypes else None
+            nAns  = sum(len(self.ansTypeToQ.get(t, [])) for t in set(ansTypes)) if ansTypes else None
+            if nAns is None or (nQues is not None and nQues <= nAns):
+                candidates = self._union(self.quesTypeToQ, quesTypes)
+                quesTypes  = []
+            else:
+                candidates = self._union(self.ansTypeToQ, ansTypes)
+                ansTypes   = []
+
+        if quesTypes:
+            quesTypes = set(quesTypes)
+            candidates = [quesId for quesId in candidates if self.quesTypes[self.rank[quesId]] in quesTypes]
+        if ansTypes:
+            ansTypes = set(ansTypes)
+            candidates = [quesId for quesId in candidates if self.ansTypes[self.rank[quesId]] in ansTypes]
+        return candidates
@@ -0,0 +1,139 @@
+# coding=utf-8
+
+# Instrumentation of the loading and evaluation phases.
+
+# VQA and VQAEval report named phase spans (parse.questions, index.build, validate.results,
+# normalize, score, aggregate, ...) to an Instrumentation object. Every span carries its wall
+# time, the number of items it processed, the change of resident memory and the nesting
+# depth within the thread that opened it; spans are kept in .spans and passed to an optional callback, e.g. to forward them to
+# a metrics system. Without instrumentation a no-op object is used.
+
+# Example usage:
+#     instrument = Instrumentation(callback=lambda span: statsd.timing(span['name'], span['seconds']))
+#     vqa = VQA(quesFile, annFile, instrument=instrument)
+#     VQAEval(vqa, vqa.loadRes(resFile)).evaluate()
+#     print(instrument.summary())
+
+# The following are defined:
+#  Instrumentation  - collects phase spans and forwards them to a callback.
+#  instrumentation  - turn None, a callable or an Instrumentation into an Instrumentation.
+#  currentRSS       - current resident memory of the process in MB.
+
+import contextlib
+import os
+import threading
+import time
+
+
+def currentRSS():
+    """Current resident set size in MB, or None where /proc is not available.
+    """
+    try:
+        with open('/proc/self/statm') as fh:
+            return int(fh.read().split()[1])*os.sysconf('SC_PAGE_SIZE')/2.**20
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+class Instrumentation:
+    def __init__(self, callback=None, memory=True, keep=True):
+        """Collector of phase spans.
+
+        Args:
+            callback (callable, optional): called with every finished span dict. Defaults to None.
+            memory (bool, optional): record the change of resident memory of every span. Defaults to True.
+            keep (bool, optional): keep the finished spans in .spans. Defaults to True.
+        """
+        self.callback = callback
+        self.memory   = memory
+        self.keep     = keep
+        self.spans    = []
+        # nesting depth of every thread opening spans, e.g. ImageLoader or server threads
+        self._local   = threading.local()
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_local']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._local = threading.local()
+
+    @contextlib.contextmanager
+    def span(self, name, items=None, **attrs):
+        """Time the enclosed block as a phase.
+
+        The yielded dict can be updated inside the block, e.g. span['items'] = n.
+
+        Args:
+            name (str): phase name
+            items (int, optional): number of items processed. Defaults to None.
+            **attrs: extra attributes of the span
+
+        Yields:
+            dict: the span, with name, items, depth (in the current thread) and attrs
+        """
+        local = self._local
+        depth = getattr(local, 'depth', 0)
+        record = {'name': name, 'items': items, 'depth': depth}
+        record.update(attrs)
+        rss = currentRSS() if self.memory else None
+        local.depth = depth + 1
+        tic = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record['seconds'] = time.perf_counter() - tic
+            local.depth = depth
+            after = currentRSS() if rss is not None else None
+            record['memoryMB'] = after - rss if after is not None else None
+            if self.keep:
+                self.spans.append(record)
+            if self.callback is not None:
+                self.callback(record)
+
+    def summary(self):
+        """Total time, items, memory change and number of calls of every phase name.
+
+        Returns:
+            dict: phase name -> {'seconds', 'items', 'memoryMB', 'calls'}
+        """
+        totals = {}
+        for record in self.spans:
+            total = totals.setdefault(record['name'], {'seconds': 0., 'items': 0, 'memoryMB': 0., 'calls': 0})
+            total['seconds'] += record['seconds']
+            total['items']   += record['items'] or 0
+            total['memoryMB'] += record['memoryMB'] or 0.
+            total['calls']   += 1
+        return totals
+
+    def reset(self):
+        """Forget the collected spans.
+        """
+        self.spans = []
+
+
+class _NullInstrumentation:
+    def span(self, name, items=None, **attrs):
+        return contextlib.nullcontext({})
+
+
+nullInstrumentation = _NullInstrumentation()
+
+
+def instrumentation(instrument):
+    """Instrumentation to use for an instrument argument.
+
+    Args:
+        instrument: None, an Instrumentation (or object with the same span method) or a callable receiving span dicts
+
+    Returns:
+        object with a span method
+    """
+    if instrument is None:
+        return nullInstrumentation
+    if hasattr(instrument, 'span'):
+        return instrument
+    assert callable(instrument), 'instrument must be an Instrumentation or a callable'
+    return Instrumentation(callback=instrument, keep=False)
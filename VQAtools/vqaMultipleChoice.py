@@ -0,0 +1,111 @@
+# coding=utf-8
+
+# Multiple Choice task support (VQA v1, 18 choices per question).
+
+# The choices of every question are coded once into a Q x M matrix, so a batch of predicted
+# answers (strings or choice indices) is validated and turned into choice indices with one
+# codebook lookup and one row comparison per prediction. For scoring, every choice is
+# normalized once and the accuracy of all the M choices of all the questions is computed with
+# the vectorized rules of vqaScore; a run is then scored by indexing that matrix.
+
+# The following are defined:
+#  MultipleChoiceIndex  - coded choices, choice lookup and per-choice accuracy.
+
+import numpy as np
+
+from .vqaScore import AnswerCodebook, scoreCodes
+
+
+_chunkSize = 8192
+
+
+class MultipleChoiceIndex:
+    def __init__(self, vqa):
+        """Coded multiple choices of the questions of a VQA object.
+
+        Args:
+            vqa (VQA): object loaded from a Multiple Choice question file
+        """
+        store = vqa.store
+        if store is not None:
+            self.quesIds  = np.asarray(store.question_id, dtype=np.int64)
+            self.codebook = AnswerCodebook(store.strings)
+            self.choices  = np.asarray(store.multiple_choices, dtype=np.int32)
+        else:
+            questions = vqa.questions['questions']
+            self.quesIds  = np.fromiter((ques['question_id'] for ques in questions), dtype=np.int64, count=len(questions))
+            self.codebook = AnswerCodebook()
+            add = self.codebook.add
+            rows = [[add(choice) for choice in ques.get('multiple_choices', [])] for ques in questions]
+            self.choices = np.full((len(rows), max([len(row) for row in rows] or [0])), -1, dtype=np.int32)
+            for i, row in enumerate(rows):
+                self.choices[i, :len(row)] = row
+        assert self.choices.shape[1] > 0, 'questions have no multiple choices'
+        self.nChoices = (self.choices >= 0).sum(axis=1)
+        self.rank     = {quesId: i for i, quesId in enumerate(self.quesIds.tolist())}
+        self._scores  = {}
+
+    def __len__(self):
+        return len(self.quesIds)
+
+    def rows(self, quesIds):
+        """Rows of the given question ids.
+        """
+        rank = self.rank
+        unknown = [quesId for quesId in quesIds if quesId not in rank]
+        assert not unknown, 'question ids not in the questions, e.g. %s' % unknown[:5]
+        return np.fromiter((rank[quesId] for quesId in quesIds), dtype=np.int64, count=len(quesIds))
+
+    def choiceIndex(self, quesIds, answers, indices=None):
+        """Choice index of every prediction, -1 when it is not one of the choices of its question.
+
+        Args:
+            quesIds (sequence): question ids
+            answers (sequence): answer strings (compared exactly, as loadRes does), or integer choice indices
+            indices (bool, optional): whether answers are choice indices. Defaults to None, guessing from the type of the answers.
+
+        Returns:
+            numpy.ndarray: int64 choice indices
+        """
+        rows = self.rows(quesIds)
+        if indices is None:
+            indices = isinstance(answers, np.ndarray) and answers.dtype.kind in 'iu' or \
+                      len(answers) > 0 and isinstance(answers[0], (int, np.integer))
+        if indices:
+            index = np.asarray(answers, dtype=np.int64)
+            return np.where((index >= 0) & (index < self.nChoices[rows]), index, -1)
+        codes = self.codebook.encode(answers.tolist() if isinstance(answers, np.ndarray) else answers)
+        match = (self.choices[rows] == codes[:, None]) & (codes[:, None] >= 0)
+        return np.where(match.any(axis=1), match.argmax(axis=1), -1)
+
+    def choiceStrings(self, quesIds, index):
+        """Choice strings of choice indices.
+        """
+        codes = self.choices[self.rows(quesIds), np.asarray(index, dtype=np.int64)]
+        return [self.codebook.strings[c] for c in codes.tolist()]
+
+    def choiceScores(self, groundTruth):
+        """Accuracy of every choice of every annotated question, computed once per ground truth.
+
+        Args:
+            groundTruth (VQAGroundTruth): coded ground truth
+
+        Returns:
+            numpy.ndarray: len(groundTruth) x M accuracies in [0, 1], rows in ground truth order, 0 for padding
+        """
+        key = id(groundTruth)
+        if key not in self._scores:
+            choices = self.choices[self.rows(groundTruth.quesIds.tolist())]
+            # normalize every distinct choice once, -1 stays padding
+            used = np.unique(choices[choices >= 0])
+            lookup = np.full(len(self.codebook) + 1, -1, dtype=np.int64)
+            lookup[used] = groundTruth.encodeAnswers([self.codebook.strings[c] for c in used.tolist()])
+            choices = lookup[choices]
+            nChoices = choices.shape[1]
+            scores = np.zeros(choices.shape)
+            for start in range(0, len(choices), _chunkSize):
+                chunk = slice(start, start + _chunkSize)
+                gtCodes = np.repeat(groundTruth.gtCodes[chunk], nChoices, axis=0)
+                scores[chunk] = scoreCodes(gtCodes, choices[chunk].ravel()).reshape(-1, nChoices)
+            self._scores = {key: (groundTruth, scores)}
+        return self._scores[key][1]
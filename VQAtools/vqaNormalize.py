@@ -0,0 +1,144 @@
+# coding=utf-8
+
+# Answer normalization rules used by the VQA evaluation code.
+
+# The rules are the ones historically implemented by VQAEval.processPunctuation and
+# VQAEval.processDigitArticle. AnswerNormalizer compiles them into str.translate tables
+# and memoizes the result on the raw string, so that frequent answers ("yes", "2", "white")
+# are normalized once per process instead of once per occurrence.
+
+# The following are defined:
+#  AnswerNormalizer    - bounded-cache normalization engine.
+#  defaultNormalizer   - process-wide instance shared by the evaluation code.
+
+import re
+from functools import lru_cache
+
+
+contractions = {"aint": "ain't", "arent": "aren't", "cant": "can't", "couldve": "could've", "couldnt": "couldn't", \
+                "couldn'tve": "couldn't've", "couldnt've": "couldn't've", "didnt": "didn't", "doesnt": "doesn't", "dont": "don't", "hadnt": "hadn't", \
+                "hadnt've": "hadn't've", "hadn'tve": "hadn't've", "hasnt": "hasn't", "havent": "haven't", "hed": "he'd", "hed've": "he'd've", \
+                "he'dve": "he'd've", "hes": "he's", "howd": "how'd", "howll": "how'll", "hows": "how's", "Id've": "I'd've", "I'dve": "I'd've", \
+                "Im": "I'm", "Ive": "I've", "isnt": "isn't", "itd": "it'd", "itd've": "it'd've", "it'dve": "it'd've", "itll": "it'll", "let's": "let's", \
+                "maam": "ma'am", "mightnt": "mightn't", "mightnt've": "mightn't've", "mightn'tve": "mightn't've", "mightve": "might've", \
+                "mustnt": "mustn't", "mustve": "must've", "neednt": "needn't", "notve": "not've", "oclock": "o'clock", "oughtnt": "oughtn't", \
+                "ow's'at": "'ow's'at", "'ows'at": "'ow's'at", "'ow'sat": "'ow's'at", "shant": "shan't", "shed've": "she'd've", "she'dve": "she'd've", \
+                "she's": "she's", "shouldve": "should've", "shouldnt": "shouldn't", "shouldnt've": "shouldn't've", "shouldn'tve": "shouldn't've", \
+                "somebody'd": "somebodyd", "somebodyd've": "somebody'd've", "somebody'dve": "somebody'd've", "somebodyll": "somebody'll", \
+                "somebodys": "somebody's", "someoned": "someone'd", "someoned've": "someone'd've", "someone'dve": "someone'd've", \
+                "someonell": "someone'll", "someones": "someone's", "somethingd": "something'd", "somethingd've": "something'd've", \
+                "something'dve": "something'd've", "somethingll": "something'll", "thats": "that's", "thered": "there'd", "thered've": "there'd've", \
+                "there'dve": "there'd've", "therere": "there're", "theres": "there's", "theyd": "they'd", "theyd've": "they'd've", \
+                "they'dve": "they'd've", "theyll": "they'll", "theyre": "they're", "theyve": "they've", "twas": "'twas", "wasnt": "wasn't", \
+                "wed've": "we'd've", "we'dve": "we'd've", "weve": "we've", "werent": "weren't", "whatll": "what'll", "whatre": "what're", \
+                "whats": "what's", "whatve": "what've", "whens": "when's", "whered": "where'd", "wheres": "where's", "whereve": "where've", \
+                "whod": "who'd", "whod've": "who'd've", "who'dve": "who'd've", "wholl": "who'll", "whos": "who's", "whove": "who've", "whyll": "why'll", \
+                "whyre": "why're", "whys": "why's", "wont": "won't", "wouldve": "would've", "wouldnt": "wouldn't", "wouldnt've": "wouldn't've", \
+                "wouldn'tve": "wouldn't've", "yall": "y'all", "yall'll": "y'all'll", "y'allll": "y'all'll", "yall'd've": "y'all'd've", \
+                "y'alld've": "y'all'd've", "y'all'dve": "y'all'd've", "youd": "you'd", "youd've": "you'd've", "you'dve": "you'd've", \
+                "youll": "you'll", "youre": "you're", "youve": "you've"}
+manualMap    = { 'none': '0',
+                 'zero': '0',
+                 'one': '1',
+                 'two': '2',
+                 'three': '3',
+                 'four': '4',
+                 'five': '5',
+                 'six': '6',
+                 'seven': '7',
+                 'eight': '8',
+                 'nine': '9',
+                 'ten': '10'
+               }
+articles     = ['a',
+                'an',
+                'the'
+               ]
+periodStrip  = re.compile(r"(?!<=\d)(\.)(?!\d)")
+commaStrip   = re.compile(r"(\d)(\,)(\d)")
+punct        = [';', r"/", '[', ']', '"', '{', '}',
+                '(', ')', '=', '+', '\\', '_', '-',
+                '>', '<', '@', '`', ',', '?', '!']
+
+# The original implementation passed re.UNICODE positionally to periodStrip.sub, where it
+# is interpreted as the maximum number of replacements. Keep it for identical output.
+_periodCount = int(re.UNICODE)
+
+
+class AnswerNormalizer:
+    def __init__(self, cacheSize=2**20):
+        """Normalization engine for VQA answers.
+
+        Args:
+            cacheSize (int, optional): maximum number of raw strings memoized by each normalization step. None for an unbounded cache. Defaults to 2**20.
+        """
+        self.cacheSize  = cacheSize
+        self._punctSet  = frozenset(punct)
+        self._articles  = frozenset(articles)
+        self._stripAll  = str.maketrans({p: None for p in punct})
+        self._blanks    = str.maketrans({'\n': ' ', '\t': ' '})
+        self._buildCaches()
+
+    def _buildCaches(self):
+        # memoized entry points: processPunctuation is applied to ground truth answers,
+        # normalize is the full pipeline applied to predicted answers
+        self.processPunctuation  = lru_cache(maxsize=self.cacheSize)(self._processPunctuation)
+        self.processDigitArticle = lru_cache(maxsize=self.cacheSize)(self._processDigitArticle)
+        self.normalize           = lru_cache(maxsize=self.cacheSize)(self._normalize)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        for name in ('processPunctuation', 'processDigitArticle', 'normalize'):
+            del state[name]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._buildCaches()
+
+    def _processPunctuation(self, inText):
+        # every punctuation mark is either removed or replaced by a space depending only on
+        # the input text, so all of them can be applied with a single translate call
+        outText = inText
+        present = self._punctSet.intersection(inText)
+        if present:
+            if commaStrip.search(inText) is not None:
+                outText = inText.translate(self._stripAll)
+            else:
+                table = {ord(p): None if (p + ' ' in inText or ' ' + p in inText) else ' ' for p in present}
+                outText = inText.translate(table)
+        if '.' in outText:
+            outText = periodStrip.sub('', outText, count=_periodCount)
+        return outText
+
+    def _processDigitArticle(self, inText):
+        outText = []
+        for word in inText.lower().split():
+            word = manualMap.get(word, word)
+            if word not in self._articles:
+                outText.append(contractions.get(word, word))
+        return ' '.join(outText)
+
+    def _normalize(self, inText):
+        outText = inText.translate(self._blanks).strip()
+        return self._processDigitArticle(self._processPunctuation(outText))
+
+    def cacheInfo(self):
+        """Return the cache statistics of each normalization step.
+
+        Returns:
+            dict: functools cache info for processPunctuation, processDigitArticle and normalize
+        """
+        return {'processPunctuation':  self.processPunctuation.cache_info(),
+                'processDigitArticle': self.processDigitArticle.cache_info(),
+                'normalize':           self.normalize.cache_info()}
+
+    def clearCache(self):
+        """Drop all the memoized answers.
+        """
+        self.processPunctuation.cache_clear()
+        self.processDigitArticle.cache_clear()
+        self.normalize.cache_clear()
+
+
+defaultNormalizer = AnswerNormalizer()
@@ -0,0 +1,84 @@
+# coding=utf-8
+
+# Question type assignment for questions without annotations.
+
+# Question types of the VQA annotations are the longest prefix of the question, among the
+# types listed in VQAtools/QuestionTypes/<dataType>_question_types.txt (package data), and 'none of the above' when no
+# prefix matches. QuestionTypeClassifier compiles the type list into a word trie, so every
+# question costs one split of its first words and a few dict lookups.
+
+# The following are defined:
+#  QuestionTypeClassifier  - longest prefix question type of question strings.
+
+import os
+
+
+_typesDir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'QuestionTypes')
+_strip = '?!.,;:"'
+
+
+class QuestionTypeClassifier:
+    def __init__(self, types, fallback='none of the above'):
+        """Word trie of question type prefixes.
+
+        Args:
+            types (list): question types, e.g. 'what color is the'
+            fallback (str, optional): type of questions matching no prefix. Defaults to 'none of the above'.
+        """
+        self.types    = [t for t in types if t != fallback]
+        self.fallback = fallback
+        self.trie     = {}
+        self.depth    = 0
+        for quesType in self.types:
+            words = quesType.split()
+            node = self.trie
+            for word in words:
+                node = node.setdefault(word, {})
+            node[None] = quesType
+            self.depth = max(self.depth, len(words))
+
+    @classmethod
+    def fromFile(cls, path, fallback='none of the above'):
+        """Classifier of the types listed one per line in a file.
+        """
+        with open(path) as fh:
+            return cls([line.strip() for line in fh if line.strip()], fallback)
+
+    @classmethod
+    def fromDataType(cls, dataType='mscoco', typesDir=None):
+        """Classifier of the official types of a data type.
+
+        Args:
+            dataType (str, optional): 'mscoco' or 'abstract_v002'. Defaults to 'mscoco'.
+            typesDir (str, optional): directory of the <dataType>_question_types.txt files. Defaults to the QuestionTypes folder of the package.
+
+        Returns:
+            QuestionTypeClassifier: classifier
+        """
+        path = os.path.join(typesDir or _typesDir, '%s_question_types.txt' % dataType)
+        assert os.path.isfile(path), 'question type list %s not found, pass typesDir' % path
+        return cls.fromFile(path)
+
+    def classify(self, question):
+        """Longest matching question type of one question.
+        """
+        node = self.trie
+        quesType = self.fallback
+        for word in question.lower().split(None, self.depth)[:self.depth]:
+            node = node.get(word.strip(_strip))
+            if node is None:
+                break
+            quesType = node.get(None, quesType)
+        return quesType
+
+    def classifyMany(self, questions):
+        """Question types of many questions, in one pass.
+
+        Args:
+            questions (iterable): question strings
+
+        Returns:
+            list: question type of each question
+        """
+        classify = self.classify
+        return [classify(question) for question in questions]
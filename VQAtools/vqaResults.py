@@ -0,0 +1,195 @@
+# coding=utf-8
+
+# Per-question evaluation results stored as aligned arrays.
+
+# EvalResults keeps the question id, the unrounded accuracy and the question and answer type
+# codes of every evaluated question. The dicts VQAEval used to fill question by question
+# (evalQA, evalQuesType, evalAnsType) are built only when first accessed, and the results can
+# be written to JSON (same content as json.dump of those dicts), NPZ or CSV in chunks,
+# without building the dicts at all.
+
+# The following are defined:
+#  EvalResults  - aligned per-question arrays with lazy dict views and bulk export.
+
+import csv
+import json
+
+import numpy as np
+
+
+_chunkSize = 65536
+
+
+def _sequentialSums(codes, weights, size):
+    # bincount adds the weights in order, like the python sums of VQAEval.setAccuracy
+    return np.bincount(codes, weights=weights, minlength=size)
+
+
+class EvalResults:
+    fileTypes = ['accuracy', 'evalQA', 'evalQuesType', 'evalAnsType']
+
+    def __init__(self, quesIds, accs, quesTypeCodes, quesTypeNames, ansTypeCodes, ansTypeNames, n=2):
+        """Per-question results of one evaluation.
+
+        Args:
+            quesIds (array_like): question ids, in evaluation order
+            accs (array_like): accuracy in [0, 1] of each question
+            quesTypeCodes (array_like): question type code of each question
+            quesTypeNames (list): question type of each code
+            ansTypeCodes (array_like): answer type code of each question
+            ansTypeNames (list): answer type of each code
+            n (int, optional): precision of the accuracies (number of places after decimal). Defaults to 2.
+        """
+        self.quesIds       = np.asarray(quesIds, dtype=np.int64)
+        self.accs          = np.asarray(accs, dtype=np.float64)
+        self.quesTypeCodes = np.asarray(quesTypeCodes, dtype=np.int64)
+        self.quesTypeNames = list(quesTypeNames)
+        self.ansTypeCodes  = np.asarray(ansTypeCodes, dtype=np.int64)
+        self.ansTypeNames  = list(ansTypeNames)
+        self.n             = n
+        self._views        = {}
+
+    @classmethod
+    def fromLabels(cls, quesIds, accs, quesTypes, ansTypes, n=2):
+        """Build results from type labels instead of codes.
+
+        Args:
+            quesIds (list): question ids
+            accs (list): accuracy in [0, 1] of each question
+            quesTypes (list): question type of each question
+            ansTypes (list): answer type of each question
+            n (int, optional): precision of the accuracies. Defaults to 2.
+
+        Returns:
+            EvalResults: results with types coded in order of first appearance
+        """
+        def encode(labels):
+            codes = {}
+            return [codes.setdefault(label, len(codes)) for label in labels], list(codes)
+        quesTypeCodes, quesTypeNames = encode(quesTypes)
+        ansTypeCodes, ansTypeNames   = encode(ansTypes)
+        return cls(quesIds, accs, quesTypeCodes, quesTypeNames, ansTypeCodes, ansTypeNames, n)
+
+    def __len__(self):
+        return len(self.quesIds)
+
+    def _seen(self, codes):
+        # codes in order of first appearance
+        _, first = np.unique(codes, return_index=True)
+        return codes[np.sort(first)].tolist()
+
+    def _groups(self, codes, names):
+        # (type, positions of its questions in evaluation order) in order of first appearance
+        order = np.argsort(codes, kind='stable')
+        bounds = np.searchsorted(codes[order], self._seen(codes))
+        counts = np.bincount(codes)
+        for code, start in zip(self._seen(codes), bounds.tolist()):
+            yield names[code], order[start:start + counts[code]]
+
+    def accuracy(self):
+        """Overall, per question type and per answer type accuracy, as VQAEval.accuracy.
+        """
+        n = self.n
+        total = float(_sequentialSums(np.zeros(len(self), dtype=np.int64), self.accs, 1)[0])
+        accuracy = {'overall': round(100*total/len(self), n)}
+        for key, codes, names in (('perQuestionType', self.quesTypeCodes, self.quesTypeNames),
+                                  ('perAnswerType', self.ansTypeCodes, self.ansTypeNames)):
+            sums   = _sequentialSums(codes, self.accs, len(names))
+            counts = np.bincount(codes, minlength=len(names))
+            accuracy[key] = {names[c]: round(100*float(sums[c])/counts[c], n) for c in self._seen(codes)}
+        return accuracy
+
+    def _rounded(self, positions=None):
+        accs = self.accs if positions is None else self.accs[positions]
+        return [round(100*acc, self.n) for acc in accs.tolist()]
+
+    @property
+    def evalQA(self):
+        """Question id -> accuracy in percent, built on first access.
+        """
+        if 'evalQA' not in self._views:
+            self._views['evalQA'] = dict(zip(self.quesIds.tolist(), self._rounded()))
+        return self._views['evalQA']
+
+    def _typeView(self, name, codes, names):
+        if name not in self._views:
+            self._views[name] = {label: dict(zip(self.quesIds[positions].tolist(), self._rounded(positions)))
+                                 for label, positions in self._groups(codes, names)}
+        return self._views[name]
+
+    @property
+    def evalQuesType(self):
+        """Question type -> question id -> accuracy in percent, built on first access.
+        """
+        return self._typeView('evalQuesType', self.quesTypeCodes, self.quesTypeNames)
+
+    @property
+    def evalAnsType(self):
+        """Answer type -> question id -> accuracy in percent, built on first access.
+        """
+        return self._typeView('evalAnsType', self.ansTypeCodes, self.ansTypeNames)
+
+    def _writeItems(self, fh, positions):
+        # '"quesId": acc' members of a JSON object, in chunks
+        for start in range(0, len(positions), _chunkSize):
+            chunk = positions[start:start + _chunkSize]
+            fh.write(', ' if start else '')
+            fh.write(', '.join('"%d": %r' % item for item in zip(self.quesIds[chunk].tolist(), self._rounded(chunk))))
+
+    def saveJson(self, path, fileType='evalQA'):
+        """Write one of the VQAEval result files, with the content json.dump gives for the dict.
+
+        Args:
+            path (str): output file name
+            fileType (str, optional): 'accuracy', 'evalQA', 'evalQuesType' or 'evalAnsType'. Defaults to 'evalQA'.
+        """
+        assert fileType in self.fileTypes, 'unknown file type %s' % fileType
+        with open(path, 'w') as fh:
+            if fileType == 'accuracy':
+                json.dump(self.accuracy(), fh)
+            elif len(np.unique(self.quesIds)) != len(self):
+                # repeated question ids keep the last accuracy, as the dict does
+                json.dump(getattr(self, fileType), fh)
+            elif fileType == 'evalQA':
+                fh.write('{')
+                self._writeItems(fh, np.arange(len(self)))
+                fh.write('}')
+            else:
+                codes, names = ((self.quesTypeCodes, self.quesTypeNames) if fileType == 'evalQuesType'
+                                else (self.ansTypeCodes, self.ansTypeNames))
+                fh.write('{')
+                for i, (label, positions) in enumerate(self._groups(codes, names)):
+                    fh.write('%s%s: {' % (', ' if i else '', json.dumps(label)))
+                    self._writeItems(fh, positions)
+                    fh.write('}')
+                fh.write('}')
+
+    def saveCsv(self, path):
+        """Write one row per question: question_id, accuracy (percent), question_type, answer_type.
+        """
+        quesTypeNames = self.quesTypeNames
+        ansTypeNames  = self.ansTypeNames
+        with open(path, 'w', newline='') as fh:
+            writer = csv.writer(fh)
+            writer.writerow(['question_id', 'accuracy', 'question_type', 'answer_type'])
+            for start in range(0, len(self), _chunkSize):
+                chunk = slice(start, start + _chunkSize)
+                writer.writerows(zip(self.quesIds[chunk].tolist(), self._rounded(np.arange(len(self))[chunk]),
+                                     [quesTypeNames[c] for c in self.quesTypeCodes[chunk].tolist()],
+                                     [ansTypeNames[c] for c in self.ansTypeCodes[chunk].tolist()]))
+
+    def saveNpz(self, path):
+        """Write the arrays (unrounded accuracies in [0, 1]) to an .npz file readable by loadNpz.
+        """
+        np.savez(path, question_id=self.quesIds, accuracy=self.accs,
+                 question_type=self.quesTypeCodes, question_type_names=np.array(self.quesTypeNames, dtype=str),
+                 answer_type=self.ansTypeCodes, answer_type_names=np.array(self.ansTypeNames, dtype=str),
+                 n=np.int64(self.n))
+
+    @classmethod
+    def loadNpz(cls, path):
+        """Load results written by saveNpz.
+        """
+        with np.load(path) as data:
+            return cls(data['question_id'], data['accuracy'], data['question_type'], data['question_type_names'].tolist(),
+                       data['answer_type'], data['answer_type_names'].tolist(), int(data['n']))
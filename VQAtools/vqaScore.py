@@ -0,0 +1,89 @@
+# coding=utf-8
+
+# Counting-based implementation of the VQA accuracy metric.
+
+# For a predicted answer and the n ground truth answers of a question, the accuracy is the
+# average over the n leave-one-out subsets of min(1, #matches/3). If c ground truth answers
+# match the prediction, a matching answer sees c-1 matches among the others and a non
+# matching one sees c, so the whole metric is a function of the match pattern only.
+# Partial sums are accumulated in ground truth order so that results are bit-identical
+# to the original per-question loop (tests/test_vqaScore.py).
+
+# The following are defined:
+#  AnswerCodebook       - string to integer code mapping for answers.
+#  scoreCodes           - vectorized accuracy of N predictions against N x K ground truth codes.
+
+import numpy as np
+
+
+class AnswerCodebook:
+    def __init__(self, strings=()):
+        """Mapping between answer strings and integer codes. Unknown answers are encoded as -1.
+
+        Args:
+            strings (iterable, optional): initial answers, coded in order of first appearance. Defaults to ().
+        """
+        self.strings = []
+        self.codes   = {}
+        for s in strings:
+            self.add(s)
+
+    def __len__(self):
+        return len(self.strings)
+
+    def __contains__(self, s):
+        return s in self.codes
+
+    def add(self, s):
+        """Return the code of an answer, adding it to the codebook if needed.
+        """
+        code = self.codes.get(s)
+        if code is None:
+            code = self.codes[s] = len(self.strings)
+            self.strings.append(s)
+        return code
+
+    def encode(self, answers, grow=False):
+        """Encode a sequence of answers.
+
+        Args:
+            answers (iterable): answer strings
+            grow (bool, optional): add unknown answers to the codebook instead of encoding them as -1. Defaults to False.
+
+        Returns:
+            numpy.ndarray: int64 array of codes
+        """
+        if grow:
+            return np.fromiter((self.add(s) for s in answers), dtype=np.int64)
+        codes = self.codes
+        return np.fromiter((codes.get(s, -1) for s in answers), dtype=np.int64)
+
+    def decode(self, codes):
+        """Decode a sequence of codes, -1 is decoded as None.
+        """
+        return [self.strings[c] if c >= 0 else None for c in codes]
+
+
+def scoreCodes(gtCodes, resCodes):
+    """Vectorized accuracy of a whole split.
+
+    Args:
+        gtCodes (array_like): N x K integer ground truth codes, negative entries are padding
+        resCodes (array_like): N integer prediction codes, negative entries never match
+
+    Returns:
+        numpy.ndarray: N float64 accuracies in [0, 1], identical to the original per-question loop
+    """
+    gtCodes  = np.asarray(gtCodes)
+    resCodes = np.asarray(resCodes)
+    assert gtCodes.ndim == 2 and resCodes.shape == (gtCodes.shape[0],), 'expected N x K ground truth and N predictions'
+    valid = gtCodes >= 0
+    match = (gtCodes == resCodes[:, None]) & valid
+    count = match.sum(axis=1)
+    hit   = np.minimum(1., (count - 1)/3.)
+    miss  = np.minimum(1., count/3.)
+    acc = np.zeros(gtCodes.shape[0])
+    for col in range(gtCodes.shape[1]):
+        acc += np.where(match[:, col], hit, np.where(valid[:, col], miss, 0.))
+    nAns = valid.sum(axis=1)
+    return np.divide(acc, nAns, out=np.zeros_like(acc), where=nAns > 0)
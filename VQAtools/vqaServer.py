@@ -0,0 +1,327 @@
+# coding=utf-8
+
+# Long-lived evaluation service.
+
+# EvaluationServer loads one or more annotation splits once, normalizes and codes their ground
+# truth (VQABatchEval), then scores result payloads posted to a local HTTP endpoint, on TCP or
+# on a Unix socket. Requests are handled by threads and scored by a process pool forked after
+# the ground truth is built, so workers share it copy-on-write and each submission only pays
+# for parsing and scoring its predictions. Accuracies are identical to VQAEval.evaluate.
+
+# Endpoints:
+#     GET  /splits              names and number of questions of the loaded splits
+#     POST /evaluate/<split>    body: result file content (list of {'question_id', 'answer'})
+#                               or {question_id: answer}; ?requireAll=false allows partial results
+#                               returns {'split', 'questions', 'accuracy', 'seconds'}
+
+# Example usage:
+#     python -m VQAtools.vqaServer --split val2014=questions.json,annotations.json --port 8765
+#     curl --data-binary @results.json http://127.0.0.1:8765/evaluate/val2014
+
+# The following are defined:
+#  EvaluationServer  - HTTP evaluation service over preloaded splits.
+#  EvaluationClient  - minimal client of an EvaluationServer.
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from .vqa import VQA
+from .vqaBatchEval import VQABatchEval
+from .vqaStream import openInput
+
+# evaluators of the server owning the pool of a worker, set by its initializer
+_evaluators = None
+
+
+def _initWorker(evaluators):
+    global _evaluators
+    _evaluators = evaluators
+
+
+def _parsePayload(payload):
+    predictions = json.loads(payload)
+    if isinstance(predictions, dict):
+        predictions = {int(quesId): answer for quesId, answer in predictions.items()}
+    return predictions
+
+
+def _scoreWorker(split, payload, requireAll):
+    return _scoreRequest(_evaluators, split, payload, requireAll)
+
+
+def _scoreRequest(evaluators, split, payload, requireAll):
+    evaluator = evaluators[split]
+    predictions = _parsePayload(payload)
+    rows, accs = evaluator.score(predictions, requireAll=requireAll)
+    return {'split': split, 'questions': len(rows), 'accuracy': evaluator.accuracy(rows, accs)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def address_string(self):
+        # Unix socket clients have no address
+        return self.client_address[0] if self.client_address else 'unix'
+
+    def log_message(self, format, *args):
+        if self.server.app.verbose:
+            BaseHTTPRequestHandler.log_message(self, format, *args)
+
+    def reply(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self):
+        app = self.server.app
+        if urlparse(self.path).path.rstrip('/') == '/splits':
+            self.reply(200, {name: len(evaluator.groundTruth) for name, evaluator in app.evaluators.items()})
+        else:
+            self.reply(404, {'error': 'unknown endpoint %s' % self.path})
+
+    def do_POST(self):
+        app = self.server.app
+        url = urlparse(self.path)
+        parts = url.path.strip('/').split('/')
+        # read the body before any reply, the client may still be sending it
+        payload = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        if len(parts) != 2 or parts[0] != 'evaluate':
+            return self.reply(404, {'error': 'unknown endpoint %s' % self.path})
+        if parts[1] not in app.evaluators:
+            return self.reply(404, {'error': 'unknown split %s' % parts[1]})
+        requireAll = parse_qs(url.query).get('requireAll', ['true'])[0].lower() not in ('0', 'false', 'no')
+        tic = time.perf_counter()
+        try:
+            result = app.score(parts[1], payload, requireAll)
+        except (AssertionError, ValueError, KeyError, TypeError) as error:
+            return self.reply(400, {'error': '%s: %s' % (type(error).__name__, error)})
+        result['seconds'] = time.perf_counter() - tic
+        self.reply(200, result)
+
+
+class _TCPServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def get_request(self):
+        request, _ = socketserver.UnixStreamServer.get_request(self)
+        return request, ('unix', 0)
+
+
+class EvaluationServer:
+    def __init__(self, splits, host='127.0.0.1', port=8765, socketPath=None, workers=None, n=2, compact=False, verbose=False):
+        """Load the splits and open the endpoint; call serveForever or start to handle requests.
+
+        Args:
+            splits (dict): split name -> VQA object with annotations, or (question file, annotation file)
+            host (str, optional): TCP host. Defaults to '127.0.0.1'.
+            port (int, optional): TCP port, 0 for any free port. Defaults to 8765.
+            socketPath (str, optional): listen on this Unix socket instead of TCP. Defaults to None.
+            workers (int, optional): scoring processes, 0 to score in the request threads. Defaults to the number of CPUs.
+            n (int, optional): precision of the accuracies (number of places after decimal). Defaults to 2.
+            compact (bool, optional): load split files in compact storage. Defaults to False.
+            verbose (bool, optional): print loading progress and requests. Defaults to False.
+        """
+        self.verbose    = verbose
+        self.evaluators = {}
+        for name, split in splits.items():
+            vqa = split if isinstance(split, VQA) else VQA(split[0], split[1], verbose=verbose, compact=compact)
+            self.evaluators[name] = VQABatchEval(vqa, n=n)
+            if verbose:
+                print('split %s ready: %d questions' % (name, len(self.evaluators[name].groundTruth)))
+        workers = os.cpu_count() if workers is None else workers
+        self.pool = None
+        if workers > 0:
+            # the evaluators go to the workers of this pool only, inherited (not pickled) under fork
+            context = multiprocessing.get_context('fork' if 'fork' in multiprocessing.get_all_start_methods() else None)
+            self.pool = context.Pool(workers, initializer=_initWorker, initargs=(self.evaluators,))
+        self.socketPath = socketPath
+        if socketPath is not None:
+            if os.path.exists(socketPath):
+                os.unlink(socketPath)
+            self.httpd = _UnixServer(socketPath, _Handler)
+        else:
+            self.httpd = _TCPServer((host, port), _Handler)
+        self.httpd.app = self
+        self._thread = None
+
+    @property
+    def address(self):
+        """(host, port) of the TCP endpoint, or the Unix socket path.
+        """
+        return self.socketPath if self.socketPath is not None else self.httpd.server_address[:2]
+
+    def score(self, split, payload, requireAll=True):
+        """Score a result payload (JSON bytes or str) against a split.
+
+        Returns:
+            dict: split, number of questions and accuracy breakdown
+        """
+        if self.pool is None:
+            return _scoreRequest(self.evaluators, split, payload, requireAll)
+        return self.pool.apply(_scoreWorker, (split, payload, requireAll))
+
+    def serveForever(self):
+        """Handle requests until close is called.
+        """
+        self.httpd.serve_forever()
+
+    def start(self):
+        """Handle requests in a background thread.
+        """
+        self._thread = threading.Thread(target=self.serveForever, daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        """Stop serving and terminate the workers.
+        """
+        if self._thread is not None:
+            self.httpd.shutdown()
+            self._thread.join()
+            self._thread = None
+        self.httpd.server_close()
+        if self.pool is not None:
+            self.pool.terminate()
+            self.pool.join()
+            self.pool = None
+        if self.socketPath is not None and os.path.exists(self.socketPath):
+            os.unlink(self.socketPath)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class _UnixConnection(http.client.HTTPConnection):
+    def __init__(self, socketPath, timeout=None):
+        http.client.HTTPConnection.__init__(self, 'localhost', timeout=timeout)
+        self.socketPath = socketPath
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        if self.timeout is not None:
+            self.sock.settimeout(self.timeout)
+        self.sock.connect(self.socketPath)
+
+
+class EvaluationClient:
+    def __init__(self, host='127.0.0.1', port=8765, socketPath=None, timeout=None):
+        """Client of an EvaluationServer.
+
+        Args:
+            host (str, optional): server host. Defaults to '127.0.0.1'.
+            port (int, optional): server port. Defaults to 8765.
+            socketPath (str, optional): Unix socket of the server instead of TCP. Defaults to None.
+            timeout (float, optional): socket timeout in seconds. Defaults to None.
+        """
+        self.host       = host
+        self.port       = port
+        self.socketPath = socketPath
+        self.timeout    = timeout
+
+    def _request(self, method, path, body=None):
+        if self.socketPath is not None:
+            connection = _UnixConnection(self.socketPath, self.timeout)
+        else:
+            connection = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        try:
+            connection.request(method, path, body=body)
+            response = connection.getresponse()
+            result = json.loads(response.read())
+        finally:
+            connection.close()
+        assert response.status == 200, result.get('error', response.reason)
+        return result
+
+    def splits(self):
+        """Names and number of questions of the splits of the server.
+        """
+        return self._request('GET', '/splits')
+
+    def evaluate(self, split, results, requireAll=True):
+        """Score results against a split of the server.
+
+        Args:
+            split (str): split name
+            results: result file name (plain, compressed or in a .zip archive), JSON bytes, list of result objects or dict question id -> answer
+            requireAll (bool, optional): require a prediction for every annotated question. Defaults to True.
+
+        Returns:
+            dict: split, questions, accuracy (as VQAEval.accuracy) and server-side seconds
+        """
+        if isinstance(results, str):
+            with openInput(results) as fh:
+                results = fh.read().encode('utf-8')
+        elif not isinstance(results, bytes):
+            results = json.dumps(results).encode('utf-8')
+        return self._request('POST', '/evaluate/%s%s' % (split, '' if requireAll else '?requireAll=false'), results)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--split",
+        type=str,
+        action='append',
+        required=True,
+        help="name=questionFile,annotationFile; can be repeated"
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default='127.0.0.1',
+        help="TCP host"
+    )
+    parser.add_argument(
+        "--port",
+        type=int,
+        default=8765,
+        help="TCP port"
+    )
+    parser.add_argument(
+        "--socket",
+        type=str,
+        default=None,
+        help="Listen on this Unix socket instead of TCP"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Scoring processes (default: number of CPUs, 0 to score in the request threads)"
+    )
+    parser.add_argument(
+        "--compact",
+        action='store_true',
+        help="Load the splits in compact storage"
+    )
+    args = parser.parse_args()
+
+    splits = {}
+    for spec in args.split:
+        name, files = spec.split('=', 1)
+        splits[name] = tuple(files.split(','))
+    server = EvaluationServer(splits, args.host, args.port, args.socket, args.workers, compact=args.compact, verbose=True)
+    print('serving on %s' % (server.address,))
+    try:
+        server.serveForever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.close()
@@ -0,0 +1,144 @@
+# coding=utf-8
+
+# Confidence intervals and paired significance tests for VQA accuracy.
+
+# Per-question VQA accuracies take few distinct values (0, 1/3, 0.6, 0.9, 1, ...), so
+# resampling N questions with replacement is the same as drawing a multinomial over the
+# distinct values with their observed frequencies, and a paired sign-flip permutation is a
+# binomial per distinct difference. Both are drawn for all resamples at once with NumPy, so
+# 10k resamples of a whole split cost a few small matrix products.
+
+# The following are defined:
+#  bootstrapCI   - percentile bootstrap confidence intervals of accuracy.
+#  pairedTest    - paired bootstrap or permutation test between two runs.
+#  evalArrays    - per-question arrays from the results of a VQAEval.
+
+import numpy as np
+
+
+# resamples are drawn in chunks of at most _chunkValues draws (resamples x distinct values)
+_chunkValues = 2**20
+
+
+def _chunks(nResamples, nValues):
+    size = max(1, _chunkValues//max(1, nValues))
+    for start in range(0, nResamples, size):
+        yield min(size, nResamples - start)
+
+
+def _resampleMeans(values, nResamples, rng):
+    vals, counts = np.unique(values, return_counts=True)
+    n = counts.sum()
+    return np.concatenate([rng.multinomial(n, counts/float(n), size=size).dot(vals)/n
+                           for size in _chunks(nResamples, len(vals))])
+
+
+def _signFlipMeans(diffs, nResamples, rng):
+    vals, counts = np.unique(diffs, return_counts=True)
+    return np.concatenate([(2*rng.binomial(counts, 0.5, size=(size, len(counts))) - counts).dot(vals)/float(counts.sum())
+                           for size in _chunks(nResamples, len(vals))])
+
+
+def _breakdowns(groups):
+    # yields (breakdown name, group label, question mask) for every requested breakdown
+    for name, labels in (groups or {}).items():
+        labels = np.asarray(labels)
+        for label in dict.fromkeys(labels.tolist()):
+            yield name, label, labels == label
+
+
+def _interval(samples, alpha):
+    low, high = np.percentile(samples, [100*alpha/2, 100*(1 - alpha/2)])
+    return float(low), float(high)
+
+
+def bootstrapCI(accs, groups=None, nResamples=10000, alpha=0.05, seed=None):
+    """Percentile bootstrap confidence intervals of the accuracy.
+
+    Resamples are drawn in chunks, so memory stays bounded (about 8 MB) whatever nResamples.
+
+    Args:
+        accs (array_like): accuracy in [0, 1] of each question
+        groups (dict, optional): breakdown name -> label of each question, e.g. {'perQuestionType': quesTypes}. Groups are resampled separately. Defaults to None.
+        nResamples (int, optional): number of bootstrap resamples. Defaults to 10000.
+        alpha (float, optional): 1 - confidence level. Defaults to 0.05.
+        seed (int, optional): random seed. Defaults to None.
+
+    Returns:
+        dict: 'overall' and every breakdown, with accuracy, low and high bounds in percent
+    """
+    rng  = np.random.default_rng(seed)
+    accs = np.asarray(accs, dtype=np.float64)
+    def estimate(values):
+        low, high = _interval(_resampleMeans(values, nResamples, rng), alpha)
+        return {'accuracy': 100*float(values.mean()), 'low': 100*low, 'high': 100*high}
+    result = {'overall': estimate(accs)}
+    for name, label, mask in _breakdowns(groups):
+        result.setdefault(name, {})[label] = estimate(accs[mask])
+    return result
+
+
+def pairedTest(accsA, accsB, groups=None, method='bootstrap', nResamples=10000, alpha=0.05, seed=None):
+    """Paired significance test of the accuracy difference A - B on the same questions.
+
+    Args:
+        accsA (array_like): accuracy in [0, 1] of each question for run A
+        accsB (array_like): accuracy in [0, 1] of the same questions for run B
+        groups (dict, optional): breakdown name -> label of each question, tested separately. Defaults to None.
+        method (str, optional): 'bootstrap' (percentile interval, p-value of the difference having the other sign) or 'permutation' (paired sign-flip test). Defaults to 'bootstrap'.
+        nResamples (int, optional): number of resamples. Defaults to 10000.
+        alpha (float, optional): 1 - confidence level of the bootstrap interval. Defaults to 0.05.
+        seed (int, optional): random seed. Defaults to None.
+
+    Both methods count the observed difference as one of the resamples, so a p-value is never
+    below 1/(nResamples + 1). Resamples are drawn in chunks, so memory stays bounded (about
+    8 MB) whatever nResamples and the number of distinct per-question differences.
+
+    Returns:
+        dict: 'overall' and every breakdown, with difference (percent), two-sided pValue and, for bootstrap, low and high bounds
+    """
+    assert method in ('bootstrap', 'permutation'), 'unknown method %s' % method
+    rng   = np.random.default_rng(seed)
+    diffs = np.asarray(accsA, dtype=np.float64) - np.asarray(accsB, dtype=np.float64)
+    def test(values):
+        observed = float(values.mean())
+        if method == 'bootstrap':
+            samples = _resampleMeans(values, nResamples, rng)
+            pValue  = min(1., 2*(1 + min(np.sum(samples <= 0), np.sum(samples >= 0)))/float(nResamples + 1))
+            low, high = _interval(samples, alpha)
+            return {'difference': 100*observed, 'low': 100*low, 'high': 100*high, 'pValue': float(pValue)}
+        samples = _signFlipMeans(values, nResamples, rng)
+        pValue  = (1 + np.sum(np.abs(samples) >= abs(observed) - 1e-12))/float(nResamples + 1)
+        return {'difference': 100*observed, 'pValue': float(pValue)}
+    result = {'overall': test(diffs)}
+    for name, label, mask in _breakdowns(groups):
+        result.setdefault(name, {})[label] = test(diffs[mask])
+    return result
+
+
+def evalArrays(vqaEval, quesIds=None):
+    """Per-question arrays of an evaluated VQAEval, for bootstrapCI and pairedTest.
+
+    The arrays are read from vqaEval.results, so accuracies are not rounded as in evalQA.
+
+    Args:
+        vqaEval (VQAEval): evaluated object
+        quesIds (list, optional): question ids, e.g. to align two runs. Defaults to the evaluated questions, in evaluation order.
+
+    Returns:
+        tuple: (question ids, accuracy in [0, 1], {'perQuestionType': labels, 'perAnswerType': labels})
+    """
+    results = vqaEval.results
+    assert results is not None, 'nothing evaluated yet'
+    if quesIds is None:
+        quesIds = results.quesIds.tolist()
+        rows = np.arange(len(quesIds))
+    else:
+        quesIds = list(quesIds)
+        rank = {quesId: i for i, quesId in enumerate(results.quesIds.tolist())}
+        rows = np.array([rank[quesId] for quesId in quesIds], dtype=np.int64)
+    groups = {}
+    for name, codes, names in (('perQuestionType', results.quesTypeCodes, results.quesTypeNames),
+                               ('perAnswerType', results.ansTypeCodes, results.ansTypeNames)):
+        groups[name] = np.array(names, dtype=object)[codes[rows]]
+    return quesIds, results.accs[rows], groups
@@ -0,0 +1,435 @@
+# coding=utf-8
+
+# Columnar storage for VQA questions and annotations.
+
+# Records are stored as one row per question: ids and type codes in typed arrays, answers as
+# codes into an interned string table and question texts as offsets into one utf-8 buffer.
+# A store can be saved to a directory of .npy files and memory-mapped back, so that loading
+# costs no parsing and processes on the same node share the pages. Dict-like views build
+# the usual question and annotation records on demand.
+
+# The following are defined:
+#  VQAStore     - columnar questions and annotations, with save/load.
+#  StringTable  - strings stored as offsets into a utf-8 buffer.
+#  StoreBuilder - incremental construction of a VQAStore, one record at a time.
+
+import json
+import os
+import sys
+from array import array
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+
+FORMAT_VERSION = 1
+
+_metaFile = 'meta.json'
+
+
+def _packStrings(strings):
+    data = [s.encode('utf-8') for s in strings]
+    offsets = np.zeros(len(data) + 1, dtype=np.int64)
+    np.cumsum([len(d) for d in data], out=offsets[1:])
+    return offsets, np.frombuffer(b''.join(data), dtype=np.uint8)
+
+
+class StringTable(Sequence):
+    def __init__(self, offsets, data, memoize=True):
+        """Sequence of strings stored as offsets into a utf-8 buffer.
+
+        Args:
+            offsets (numpy.ndarray): N + 1 byte offsets
+            data (numpy.ndarray): uint8 buffer
+            memoize (bool, optional): keep decoded strings, for tables of repeated strings. Defaults to True.
+        """
+        self.offsets = offsets
+        self.data    = data
+        self._cache  = {} if memoize else None
+        self._codes  = None
+
+    @classmethod
+    def fromStrings(cls, strings, memoize=True):
+        offsets, data = _packStrings(strings)
+        return cls(offsets, data, memoize)
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if self._cache is not None:
+            s = self._cache.get(i)
+            if s is not None:
+                return s
+        s = self.data[self.offsets[i]:self.offsets[i+1]].tobytes().decode('utf-8')
+        if self._cache is not None:
+            s = self._cache[i] = sys.intern(s)
+        return s
+
+    def code(self, s, default=-1):
+        """Return the index of a string, default if it is not in the table.
+        """
+        if self._codes is None:
+            self._codes = {self[i]: i for i in range(len(self))}
+        return self._codes.get(s, default)
+
+
+class StoreBuilder:
+    def __init__(self):
+        """Incremental VQAStore construction, one record at a time.
+
+        Records are converted to codes as they are added, so parsed dicts can be discarded
+        right away (e.g. when fed by streamJson). All questions must be added before the
+        annotations.
+        """
+        self.strings    = {}
+        self.quesIds    = array('q')
+        self.imgIds     = array('q')
+        self.quesText   = bytearray()
+        self.quesEnds   = array('q')
+        self.choices    = array('i')
+        self.nChoices   = array('i')
+        self.rowOf      = {}
+        self.annRows    = array('q')
+        self.quesType   = array('i')
+        self.ansType    = array('i')
+        self.mcAnswer   = array('i')
+        self.answers    = array('i')
+        self.confidence = array('i')
+        self.answerIds  = array('i')
+        self.nAnswers   = array('i')
+
+    def code(self, s):
+        """Return the code of a string in the string table, -1 for None.
+        """
+        if s is None:
+            return -1
+        c = self.strings.get(s)
+        if c is None:
+            c = self.strings[s] = len(self.strings)
+        return c
+
+    def addQuestion(self, ques):
+        """Add a question record.
+        """
+        self.rowOf[ques['question_id']] = len(self.quesIds)
+        self.quesIds.append(ques['question_id'])
+        self.imgIds.append(ques['image_id'])
+        self.quesText += ques['question'].encode('utf-8')
+        self.quesEnds.append(len(self.quesText))
+        choices = ques.get('multiple_choices', [])
+        self.choices.extend(self.code(choice) for choice in choices)
+        self.nChoices.append(len(choices))
+
+    def addAnnotation(self, ann):
+        """Add the annotation record of a question already added.
+        """
+        row = self.rowOf[ann['question_id']]
+        assert ann['image_id'] == self.imgIds[row], 'annotation %d does not match its question' % ann['question_id']
+        self.annRows.append(row)
+        self.quesType.append(self.code(ann.get('question_type')))
+        self.ansType.append(self.code(ann.get('answer_type')))
+        self.mcAnswer.append(self.code(ann.get('multiple_choice_answer')))
+        for ans in ann['answers']:
+            self.answers.append(self.code(ans['answer']))
+            self.confidence.append(self.code(ans.get('answer_confidence')))
+            self.answerIds.append(ans.get('answer_id', -1))
+        self.nAnswers.append(len(ann['answers']))
+
+    @staticmethod
+    def _matrix(values, counts, nRows):
+        # ragged per-record values to an nRows x max(counts) matrix padded with -1
+        counts = np.frombuffer(counts, dtype=np.int32) if len(counts) else np.zeros(0, dtype=np.int32)
+        out = np.full((nRows, int(counts.max()) if len(counts) else 0), -1, dtype=np.int32)
+        if len(values):
+            starts = np.repeat(np.cumsum(counts) - counts, counts)
+            cols = np.arange(len(values)) - starts
+            out[np.repeat(np.arange(len(counts)), counts), cols] = np.frombuffer(values, dtype=np.int32)
+        return out
+
+    @staticmethod
+    def _column(values, dtype):
+        return np.frombuffer(values, dtype=dtype).copy() if len(values) else np.zeros(0, dtype=dtype)
+
+    def finish(self, questionsMeta, annotationsMeta=None):
+        """Build the store from the added records.
+
+        Args:
+            questionsMeta (dict): question file members other than 'questions'
+            annotationsMeta (dict, optional): annotation file members other than 'annotations', None without annotations. Defaults to None.
+
+        Returns:
+            VQAStore: in-memory store
+        """
+        nQues = len(self.quesIds)
+        arrays = {}
+        arrays['question_id'] = self._column(self.quesIds, np.int64)
+        arrays['image_id']    = self._column(self.imgIds, np.int64)
+        arrays['question_offsets'] = np.zeros(nQues + 1, dtype=np.int64)
+        arrays['question_offsets'][1:] = self._column(self.quesEnds, np.int64)
+        arrays['question_data'] = np.frombuffer(bytes(self.quesText), dtype=np.uint8)
+        arrays['multiple_choices'] = self._matrix(self.choices, self.nChoices, nQues)
+
+        annRows = self._column(self.annRows, np.int64)
+        annotated  = np.zeros(nQues, dtype=np.uint8)
+        annotated[annRows] = 1
+        perRow = {}
+        for name, values in (('question_type', self.quesType), ('answer_type', self.ansType), ('multiple_choice_answer', self.mcAnswer)):
+            column = np.full(nQues, -1, dtype=np.int32)
+            column[annRows] = self._column(values, np.int32)
+            perRow[name] = column
+        for name, values in (('answers', self.answers), ('answer_confidence', self.confidence), ('answer_id', self.answerIds)):
+            byAnnotation = self._matrix(values, self.nAnswers, len(annRows))
+            column = np.full((nQues, byAnnotation.shape[1]), -1, dtype=np.int32)
+            column[annRows] = byAnnotation
+            perRow[name] = column
+        arrays.update(perRow)
+        arrays['annotated'] = annotated
+        arrays['annotation_rows'] = annRows
+
+        arrays['qid_order']  = np.argsort(arrays['question_id'], kind='stable')
+        arrays['qid_sorted'] = arrays['question_id'][arrays['qid_order']]
+        # images in order of first appearance, as the keys of VQA.imgToQA
+        imgIds = arrays['image_id']
+        _, first = np.unique(imgIds, return_index=True)
+        arrays['image_keys']   = imgIds[np.sort(first)]
+        arrays['image_order']  = np.argsort(arrays['image_keys'], kind='stable')
+        arrays['image_sorted'] = arrays['image_keys'][arrays['image_order']]
+        # annotated rows of every image, in annotation order
+        annImg = np.searchsorted(arrays['image_sorted'], imgIds[annRows])
+        keyIdx = arrays['image_order'][annImg]
+        groupOrder = np.argsort(keyIdx, kind='stable')
+        arrays['image_rows'] = annRows[groupOrder]
+        counts = np.bincount(keyIdx, minlength=len(arrays['image_keys']))
+        arrays['image_offsets'] = np.zeros(len(counts) + 1, dtype=np.int64)
+        np.cumsum(counts, out=arrays['image_offsets'][1:])
+
+        arrays['string_offsets'], arrays['string_data'] = _packStrings(self.strings)
+        meta = {'version': FORMAT_VERSION, 'questions': questionsMeta, 'annotations': annotationsMeta}
+        return VQAStore(arrays, meta)
+
+
+class VQAStore:
+    # integer columns, all indexed by question row unless stated otherwise
+    columns = ['question_id', 'image_id', 'question_offsets', 'question_data', 'multiple_choices',
+               'annotated', 'annotation_rows', 'question_type', 'answer_type', 'multiple_choice_answer',
+               'answers', 'answer_confidence', 'answer_id',
+               'qid_sorted', 'qid_order', 'image_keys', 'image_sorted', 'image_order',
+               'image_offsets', 'image_rows', 'string_offsets', 'string_data']
+
+    def __init__(self, arrays, meta):
+        """Columnar questions and annotations. Use VQAStore.build or VQAStore.load to create one.
+
+        Args:
+            arrays (dict): column name to numpy array
+            meta (dict): question and annotation file members other than the records
+        """
+        self.arrays = arrays
+        self.meta   = meta
+        for name in self.columns:
+            setattr(self, name, arrays[name])
+        self.strings   = StringTable(arrays['string_offsets'], arrays['string_data'])
+        self.questionText = StringTable(arrays['question_offsets'], arrays['question_data'], memoize=False)
+        self.hasAnnotations = meta['annotations'] is not None
+
+    @classmethod
+    def build(cls, questions, annotations=None):
+        """Build a store from parsed question and annotation files.
+
+        Only the standard VQA record fields are kept: question_id, image_id, question and
+        multiple_choices for questions; question_type, answer_type, multiple_choice_answer and
+        answers (answer, answer_confidence, answer_id) for annotations.
+
+        Args:
+            questions (dict): parsed question file
+            annotations (dict, optional): parsed annotation file. Defaults to None.
+
+        Returns:
+            VQAStore: in-memory store
+        """
+        builder = StoreBuilder()
+        for ques in questions['questions']:
+            builder.addQuestion(ques)
+        if annotations is not None:
+            for ann in annotations['annotations']:
+                builder.addAnnotation(ann)
+        return builder.finish({k: v for k, v in questions.items() if k != 'questions'},
+                              None if annotations is None else {k: v for k, v in annotations.items() if k != 'annotations'})
+
+    def save(self, path):
+        """Write the store to a directory of .npy files.
+
+        Args:
+            path (str): output directory, created if needed
+        """
+        os.makedirs(path, exist_ok=True)
+        for name in self.columns:
+            np.save(os.path.join(path, name + '.npy'), np.ascontiguousarray(self.arrays[name]))
+        with open(os.path.join(path, _metaFile), 'w') as fh:
+            json.dump(self.meta, fh)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a store written by VQAStore.save.
+
+        Args:
+            path (str): store directory
+            mmap (bool, optional): memory-map the arrays instead of reading them. Defaults to True.
+
+        Returns:
+            VQAStore: loaded store
+        """
+        with open(os.path.join(path, _metaFile)) as fh:
+            meta = json.load(fh)
+        assert meta.get('version') == FORMAT_VERSION, 'unsupported VQA cache version %s' % meta.get('version')
+        mode = 'r' if mmap else None
+        arrays = {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in cls.columns}
+        return cls(arrays, meta)
+
+    def __len__(self):
+        return len(self.question_id)
+
+    def row(self, quesId):
+        """Return the row of a question id, -1 if it is not in the store.
+        """
+        i = np.searchsorted(self.qid_sorted, quesId)
+        if i < len(self.qid_sorted) and self.qid_sorted[i] == quesId:
+            return int(self.qid_order[i])
+        return -1
+
+    def imageGroup(self, imgId):
+        """Return the annotated rows of an image, None if the image is not in the store.
+        """
+        i = np.searchsorted(self.image_sorted, imgId)
+        if i < len(self.image_sorted) and self.image_sorted[i] == imgId:
+            key = self.image_order[i]
+            return self.image_rows[self.image_offsets[key]:self.image_offsets[key+1]]
+        return None
+
+    def question(self, row):
+        """Build the question record of a row.
+        """
+        ques = {'image_id': int(self.image_id[row]),
+                'question': self.questionText[row],
+                'question_id': int(self.question_id[row])}
+        choices = self.multiple_choices[row]
+        if len(choices) and choices[0] >= 0:
+            ques['multiple_choices'] = [self.strings[c] for c in choices.tolist() if c >= 0]
+        return ques
+
+    def annotation(self, row):
+        """Build the annotation record of a row.
+        """
+        strings = self.strings
+        ann = {}
+        for key, column in (('question_type', self.question_type), ('multiple_choice_answer', self.multiple_choice_answer)):
+            c = int(column[row])
+            if c >= 0:
+                ann[key] = strings[c]
+        answers = []
+        for a, conf, aid in zip(self.answers[row].tolist(), self.answer_confidence[row].tolist(), self.answer_id[row].tolist()):
+            if a < 0:
+                continue
+            ans = {'answer': strings[a]}
+            if conf >= 0:
+                ans['answer_confidence'] = strings[conf]
+            if aid >= 0:
+                ans['answer_id'] = aid
+            answers.append(ans)
+        ann['answers']  = answers
+        ann['image_id'] = int(self.image_id[row])
+        c = int(self.answer_type[row])
+        if c >= 0:
+            ann['answer_type'] = strings[c]
+        ann['question_id'] = int(self.question_id[row])
+        return ann
+
+    def questions(self):
+        """Question file view: metadata members and a lazy 'questions' list.
+        """
+        questions = dict(self.meta['questions'])
+        questions['questions'] = _RecordList(self.question, np.arange(len(self)))
+        return questions
+
+    def annotations(self):
+        """Annotation file view: metadata members and a lazy 'annotations' list, None without annotations.
+        """
+        if not self.hasAnnotations:
+            return None
+        annotations = dict(self.meta['annotations'])
+        annotations['annotations'] = _RecordList(self.annotation, self.annotation_rows)
+        return annotations
+
+
+class _RecordList(Sequence):
+    def __init__(self, build, rows):
+        self.build = build
+        self.rows  = rows
+
+    def __len__(self):
+        return len(self.rows)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self.build(row) for row in self.rows[i].tolist()]
+        return self.build(int(self.rows[i]))
+
+    def __iter__(self):
+        for row in self.rows.tolist():
+            yield self.build(row)
+
+
+class QuestionMap(Mapping):
+    def __init__(self, store):
+        """Read-only question id to question record mapping, as VQA.q2q.
+        """
+        self.store = store
+
+    def __len__(self):
+        return len(self.store)
+
+    def __iter__(self):
+        return iter(self.store.question_id.tolist())
+
+    def __contains__(self, quesId):
+        return self.store.row(quesId) >= 0
+
+    def __getitem__(self, quesId):
+        row = self.store.row(quesId)
+        if row < 0:
+            raise KeyError(quesId)
+        return self.store.question(row)
+
+
+class AnnotationMap(QuestionMap):
+    """Read-only question id to annotation record mapping, as VQA.q2a. Questions without annotation map to [].
+    """
+    def __getitem__(self, quesId):
+        row = self.store.row(quesId)
+        if row < 0:
+            raise KeyError(quesId)
+        if not self.store.annotated[row]:
+            return []
+        return self.store.annotation(row)
+
+
+class ImageMap(Mapping):
+    def __init__(self, store):
+        """Read-only image id to annotation records mapping, as VQA.imgToQA.
+        """
+        self.store = store
+
+    def __len__(self):
+        return len(self.store.image_keys)
+
+    def __iter__(self):
+        return iter(self.store.image_keys.tolist())
+
+    def __contains__(self, imgId):
+        return self.store.imageGroup(imgId) is not None
+
+    def __getitem__(self, imgId):
+        rows = self.store.imageGroup(imgId)
+        if rows is None:
+            raise KeyError(imgId)
+        return [self.store.annotation(row) for row in rows.tolist()]
@@ -0,0 +1,244 @@
+# coding=utf-8
+
+# Streaming reader for VQA question, annotation and result files.
+
+# The VQA files are JSON objects holding a few small metadata members and one large array
+# ('questions' or 'annotations'); result files are one large array. streamJson decodes the array record by record from a
+# bounded text buffer and hands every record to a callback, so the raw text of the file
+# and the intermediate document are never held in memory at once.
+
+# openInput opens the files as text whether they are plain, compressed (.gz, .bz2, .xz, .zst)
+# or members of a .zip archive such as the official downloads, decompressing on the fly, so
+# archives never need to be extracted to disk.
+
+# The following are defined:
+#  openInput   - open a plain, compressed or zipped question, annotation or result file as text.
+#  streamJson  - parse a JSON object streaming the elements of one of its arrays.
+#  streamJsonArray - parse a JSON array streaming its elements.
+#  peakRSS     - peak resident set size of the current process.
+
+import bz2
+import gzip
+import io
+import json
+import lzma
+import os
+import re
+import sys
+import zipfile
+
+try:
+    import resource
+except ImportError:  # not available on Windows
+    resource = None
+
+
+_whitespace = re.compile(r'[ \t\n\r]*')
+_zipMember  = re.compile(r'^(.*?\.zip)[/\\](.+)$', re.IGNORECASE)
+_numberChars = frozenset('0123456789.eE+-')
+
+# a decoding error this close to the end of the buffer may be a value cut by the chunk boundary
+# (a literal, a number sign or an escape sequence); errors further back are malformed input
+_truncationMargin = 6
+
+# keys whose values are repeated many times in the VQA files and are worth interning
+_internedValues = frozenset(['question_type', 'answer_type', 'answer', 'answer_confidence', 'multiple_choice_answer'])
+
+
+def _openZst(path):
+    try:
+        from compression import zstd  # Python 3.14+
+        return zstd.open(path, 'rt', encoding='utf-8')
+    except ImportError:
+        pass
+    try:
+        import zstandard
+    except ImportError:
+        raise ImportError('reading .zst files requires Python 3.14 or the zstandard package')
+    return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(open(path, 'rb'), closefd=True), encoding='utf-8')
+
+
+def _openZip(path, member=None):
+    with zipfile.ZipFile(path) as archive:
+        if member is None:
+            members = [info.filename for info in archive.infolist() if info.filename.lower().endswith('.json')]
+            assert len(members) == 1, 'select one of the JSON members of %s as %s/<member>: %s' % (path, path, members)
+            member = members[0]
+        names = archive.namelist()
+        if member not in names:
+            # allow the file name without the directories of the archive
+            matches = [name for name in names if os.path.basename(name) == member]
+            assert len(matches) == 1, 'member %s not found in %s' % (member, path)
+            member = matches[0]
+        # the member keeps the archive file open after the archive object is closed
+        return io.TextIOWrapper(archive.open(member), encoding='utf-8')
+
+
+def openInput(path, member=None):
+    """Open a question, annotation or result file as text, decompressing on the fly.
+
+    Supported are plain files, .gz, .bz2, .xz (.lzma) and .zst files and .zip archives. The
+    member of an archive is selected with member or a path such as archive.zip/member.json;
+    archives holding a single JSON file need no member.
+
+    Args:
+        path (str): file name
+        member (str, optional): member of a .zip archive. Defaults to None.
+
+    Returns:
+        file: text file object, to be closed by the caller
+    """
+    if member is None and not os.path.exists(path):
+        match = _zipMember.match(path)
+        if match is not None and os.path.isfile(match.group(1)):
+            path, member = match.groups()
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.zip':
+        return _openZip(path, member)
+    assert member is None, 'members can only be selected in .zip archives'
+    if extension == '.gz':
+        return gzip.open(path, 'rt', encoding='utf-8')
+    if extension == '.bz2':
+        return bz2.open(path, 'rt', encoding='utf-8')
+    if extension in ('.xz', '.lzma'):
+        return lzma.open(path, 'rt', encoding='utf-8')
+    if extension == '.zst':
+        return _openZst(path)
+    return open(path, 'r')
+
+
+def _internPairs(pairs):
+    # records are decoded one at a time, so the decoder cannot share key objects between
+    # them as json.load does: intern keys and the repeated values explicitly
+    intern = sys.intern
+    return {intern(k): intern(v) if k in _internedValues and type(v) == str else v for k, v in pairs}
+
+
+class _Reader:
+    def __init__(self, fileobj, chunkSize, maxRecordSize):
+        self.fileobj   = fileobj
+        self.chunkSize = chunkSize
+        self.maxRecordSize = maxRecordSize
+        self.buf       = ''
+        self.pos       = 0
+        self.eof       = False
+        self.decoder   = json.JSONDecoder(object_pairs_hook=_internPairs)
+
+    def fill(self):
+        chunk = self.fileobj.read(self.chunkSize)
+        if not chunk:
+            self.eof = True
+            return False
+        self.buf = self.buf[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def peek(self):
+        while True:
+            self.pos = _whitespace.match(self.buf, self.pos).end()
+            if self.pos < len(self.buf):
+                return self.buf[self.pos]
+            if not self.fill():
+                raise ValueError('unexpected end of JSON input')
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise ValueError('expected %r at offset %d of the current buffer' % (char, self.pos))
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buf, self.pos)
+            except json.JSONDecodeError as error:
+                # read more only if the value may continue in the next chunk
+                truncated = error.pos >= len(self.buf) - _truncationMargin or error.msg.startswith('Unterminated string')
+                if truncated and len(self.buf) - self.pos > self.maxRecordSize:
+                    raise ValueError('JSON value longer than %d characters (maxRecordSize)' % self.maxRecordSize)
+                if truncated and self.fill():
+                    continue
+                raise
+            # a number may have been cut by the end of the buffer and continue in the next chunk
+            if type(value) in (int, float) and not self.eof \
+                    and (end == len(self.buf) or self.buf[end] in _numberChars) and self.fill():
+                continue
+            self.pos = end
+            return value
+
+
+def _streamArray(reader, callback):
+    reader.expect('[')
+    if reader.peek() != ']':
+        while True:
+            callback(reader.value())
+            if reader.peek() != ',':
+                break
+            reader.expect(',')
+    reader.expect(']')
+
+
+def streamJson(fileobj, arrayKey, callback, chunkSize=2**20, maxRecordSize=2**26):
+    """Parse a JSON object, streaming the elements of one of its arrays.
+
+    Args:
+        fileobj (file): text file object positioned at the beginning of the JSON object
+        arrayKey (str): key of the array whose elements are streamed
+        callback (callable): called with each element of the array, in order
+        chunkSize (int, optional): number of characters read at a time. Defaults to 2**20.
+        maxRecordSize (int, optional): maximum number of characters of one value, so that malformed input cannot fill the memory. Defaults to 2**26.
+
+    Returns:
+        dict: the other members of the object
+    """
+    reader = _Reader(fileobj, chunkSize, maxRecordSize)
+    members = {}
+    reader.expect('{')
+    if reader.peek() == '}':
+        return members
+    while True:
+        key = reader.value()
+        reader.expect(':')
+        if key == arrayKey and reader.peek() == '[':
+            _streamArray(reader, callback)
+        else:
+            members[key] = reader.value()
+        if reader.peek() != ',':
+            break
+        reader.expect(',')
+    reader.expect('}')
+    return members
+
+
+def streamJsonArray(fileobj, callback, chunkSize=2**20, maxRecordSize=2**26):
+    """Parse a JSON array, e.g. a result file, streaming its elements.
+
+    Args:
+        fileobj (file): text file object positioned at the beginning of the JSON array
+        callback (callable): called with each element of the array, in order
+        chunkSize (int, optional): number of characters read at a time. Defaults to 2**20.
+        maxRecordSize (int, optional): maximum number of characters of one value, so that malformed input cannot fill the memory. Defaults to 2**26.
+    """
+    reader = _Reader(fileobj, chunkSize, maxRecordSize)
+    if reader.peek() != '[':
+        raise ValueError('results is not an array of objects')
+    _streamArray(reader, callback)
+    while True:
+        reader.pos = _whitespace.match(reader.buf, reader.pos).end()
+        if reader.pos < len(reader.buf):
+            raise ValueError('extra data after the JSON array')
+        if not reader.fill():
+            break
+
+
+def peakRSS():
+    """Peak resident set size of the current process.
+
+    Returns:
+        float: peak RSS in MB, None if it cannot be measured on this platform
+    """
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # bytes on macOS, kilobytes elsewhere
+    return peak/2.**20 if sys.platform == 'darwin' else peak/2.**10
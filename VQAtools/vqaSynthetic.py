@@ -0,0 +1,186 @@
+# coding=utf-8
+
+# Synthetic VQA v2-sized datasets for benchmarks.
+
+# Writes question, annotation and fake result files with the layout of the official VQA v2
+# files: ~5.4 questions per image, 10 answers per question from annotators that agree with a
+# latent answer with variable probability, mscoco question types with a long-tailed
+# frequency, and yes/no, number and other answers drawn from Zipf-like distributions (with
+# some punctuation and spelling variants to exercise normalization). Records are written one
+# at a time, so generating the full 443,757-question split needs little memory.
+
+# Example usage:
+#     python -m VQAtools.vqaSynthetic --outDir /tmp/synthetic --questions 443757
+
+# The following are defined:
+#  generate  - write synthetic question, annotation and result files.
+
+import argparse
+import json
+import os
+
+import numpy as np
+
+from .vqaQuestionTypes import QuestionTypeClassifier
+
+
+_yesNoPrefixes = ('is', 'are', 'does', 'do', 'has', 'can', 'could', 'was')
+_colors = ['white', 'black', 'red', 'blue', 'green', 'brown', 'yellow', 'gray', 'orange', 'pink', 'purple', 'silver']
+_variants = ['{}.', '{} ', 'the {}', 'a {}', '{}!', '"{}"']
+_numberWords = ['zero', 'one', 'two', 'three', 'four', 'five', 'six', 'seven', 'eight', 'nine', 'ten']
+
+
+def _answerType(quesType):
+    if quesType.startswith('how many') or quesType == 'what number is':
+        return 'number'
+    if quesType.split()[0] in _yesNoPrefixes:
+        return 'yes/no'
+    return 'other'
+
+
+def _zipf(n, s):
+    weights = 1./np.arange(1, n + 1)**s
+    return weights/weights.sum()
+
+
+class _Answers:
+    def __init__(self, rng, nOther):
+        self.rng = rng
+        self.pools = {'yes/no': (['yes', 'no'], np.array([.55, .45])),
+                      'number': ([str(i) for i in range(21)] + _numberWords[1:4], _zipf(24, 1.3)[np.r_[2, 0, 1, 3:24]]),
+                      'other':  (_colors + ['object%d' % i for i in range(nOther - len(_colors))], _zipf(nOther, 1.05))}
+
+    def draw(self, ansType, size):
+        strings, p = self.pools[ansType]
+        return [strings[i] for i in self.rng.choice(len(strings), size=size, p=p/p.sum())]
+
+    def variant(self, answer):
+        return _variants[self.rng.integers(len(_variants))].format(answer)
+
+
+def _writeJson(path, meta, key, records):
+    with open(path, 'w') as fh:
+        fh.write('{')
+        for name, value in meta.items():
+            fh.write('%s: %s, ' % (json.dumps(name), json.dumps(value)))
+        fh.write('%s: [' % json.dumps(key))
+        for i, record in enumerate(records):
+            fh.write(', ' if i else '')
+            fh.write(json.dumps(record))
+        fh.write(']}')
+
+
+def generate(outDir, nQuestions=443757, dataSubType='val2014', seed=0, nOtherAnswers=20000, resultAccuracy=0.65):
+    """Write a synthetic VQA v2 split.
+
+    Args:
+        outDir (str): output directory, created if needed
+        nQuestions (int, optional): number of questions. Defaults to 443757 (v2 train).
+        dataSubType (str, optional): data subtype used in file names and metadata. Defaults to 'val2014'.
+        seed (int, optional): random seed. Defaults to 0.
+        nOtherAnswers (int, optional): number of distinct 'other' answers. Defaults to 20000.
+        resultAccuracy (float, optional): probability that the fake results predict the latent answer. Defaults to 0.65.
+
+    Returns:
+        dict: paths of the 'questions', 'annotations' and 'results' files
+    """
+    os.makedirs(outDir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    answers = _Answers(rng, nOtherAnswers)
+    paths = {'questions':   os.path.join(outDir, 'v2_OpenEnded_mscoco_%s_questions.json' % dataSubType),
+             'annotations': os.path.join(outDir, 'v2_mscoco_%s_annotations.json' % dataSubType),
+             'results':     os.path.join(outDir, 'v2_OpenEnded_mscoco_%s_fake_results.json' % dataSubType)}
+
+    # ~5.4 questions per image, question ids are image_id * 1000 + k as in VQA v2
+    nImages = max(1, int(round(nQuestions/5.4)))
+    imgIds  = np.sort(rng.choice(600000, size=nImages, replace=False)) + 1
+    # every image gets one question, the others go to images drawn uniformly
+    if nQuestions >= nImages:
+        imgOf = np.sort(np.concatenate([np.arange(nImages), rng.integers(0, nImages, size=nQuestions - nImages)]))
+    else:
+        imgOf = np.sort(rng.choice(nImages, size=nQuestions, replace=False))
+    slot    = np.arange(nQuestions) - np.searchsorted(imgOf, imgOf)
+    quesIds = (imgIds[imgOf]*1000 + slot).tolist()
+    imgOf   = imgIds[imgOf].tolist()
+    # official mscoco types, listed by decreasing frequency
+    classifier = QuestionTypeClassifier.fromDataType('mscoco')
+    questionTypes = classifier.types + [classifier.fallback]
+    quesTypeOf = rng.choice(len(questionTypes), size=nQuestions, p=_zipf(len(questionTypes), 1.1)).tolist()
+
+    # latent answer, annotator agreement and disagreeing answers of every question
+    ansTypeOf = [_answerType(questionTypes[t]) for t in quesTypeOf]
+    latent = [None]*nQuestions
+    others = [None]*nQuestions
+    byType = {}
+    for i, ansType in enumerate(ansTypeOf):
+        byType.setdefault(ansType, []).append(i)
+    for ansType, idx in byType.items():
+        for i, ans, alt in zip(idx, answers.draw(ansType, len(idx)), np.reshape(answers.draw(ansType, 10*len(idx)), (len(idx), 10)).tolist()):
+            latent[i] = ans
+            others[i] = alt
+    agreement = rng.uniform(.3, 1., size=nQuestions)
+    agrees    = (rng.random((nQuestions, 10)) < agreement[:, None]).tolist()
+    noisy     = (rng.random((nQuestions, 10)) < .03).tolist()
+    correct   = (rng.random(nQuestions) < resultAccuracy).tolist()
+    confidence = np.array(['yes', 'maybe', 'no'])[rng.choice(3, size=(nQuestions, 10), p=[.8, .15, .05])].tolist()
+
+    meta = {'info': {'description': 'Synthetic VQA v2 dataset', 'version': '2.0', 'year': 2017},
+            'license': {'name': 'Creative Commons Attribution 4.0 International License', 'url': 'http://creativecommons.org/licenses/by/4.0/'},
+            'data_subtype': dataSubType, 'data_type': 'mscoco', 'task_type': 'Open-Ended'}
+
+    def questionRecords():
+        for i in range(nQuestions):
+            yield {'image_id': imgOf[i], 'question': '%s synthetic question %d?' % (questionTypes[quesTypeOf[i]], i), 'question_id': quesIds[i]}
+
+    def annotationRecords():
+        for i in range(nQuestions):
+            given = [latent[i] if agrees[i][j] else others[i][j] for j in range(10)]
+            given = [answers.variant(ans) if noisy[i][j] else ans for j, ans in enumerate(given)]
+            yield {'question_type': questionTypes[quesTypeOf[i]], 'multiple_choice_answer': max(set(given), key=given.count),
+                   'answers': [{'answer': ans, 'answer_confidence': confidence[i][j], 'answer_id': j + 1} for j, ans in enumerate(given)],
+                   'image_id': imgOf[i], 'answer_type': ansTypeOf[i], 'question_id': quesIds[i]}
+
+    def resultRecords():
+        for i in range(nQuestions):
+            yield {'answer': latent[i] if correct[i] else others[i][0], 'question_id': quesIds[i]}
+
+    _writeJson(paths['questions'], meta, 'questions', questionRecords())
+    _writeJson(paths['annotations'], meta, 'annotations', annotationRecords())
+    with open(paths['results'], 'w') as fh:
+        fh.write('[')
+        for i, record in enumerate(resultRecords()):
+            fh.write(', ' if i else '')
+            fh.write(json.dumps(record))
+        fh.write(']')
+    return paths
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--outDir",
+        type=str,
+        required=True,
+        help="Output directory"
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=443757,
+        help="Number of questions (default: size of VQA v2 train)"
+    )
+    parser.add_argument(
+        "--dataSubType",
+        type=str,
+        default='val2014',
+        help="Data subtype used in file names"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed"
+    )
+    args = parser.parse_args()
+    for kind, path in generate(args.outDir, args.questions, args.dataSubType, args.seed).items():
+        print('%s: %s' % (kind, path))
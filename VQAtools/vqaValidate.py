@@ -0,0 +1,210 @@
+# coding=utf-8
+
+# Validation of result files before evaluation.
+
+# ResultValidator streams a result file record by record (vqaStream) and checks it against the
+# question ids VQA.loadRes expects. Memory is one flag per expected question plus a few
+# samples, whatever the size of the file. The report counts, with samples, the missing,
+# unknown and duplicate question ids, the malformed records and, for the Multiple Choice
+# task, the answers that are not one of the choices.
+
+# Example usage:
+#     python -m VQAtools.vqaValidate \
+#         --quesFile v2_OpenEnded_mscoco_val2014_questions.json \
+#         --annFile v2_mscoco_val2014_annotations.json \
+#         --resFile v2_OpenEnded_mscoco_val2014_fake_results.json
+
+# The following are defined:
+#  ResultValidator  - check result records or files against the expected question ids.
+#  formatReport     - human readable summary of a validation report.
+
+import argparse
+import json
+import sys
+
+import numpy as np
+
+from .vqaStream import openInput, streamJsonArray
+
+
+class _Problems:
+    def __init__(self, maxSamples):
+        self.count      = 0
+        self.samples    = []
+        self.maxSamples = maxSamples
+
+    def add(self, sample):
+        self.count += 1
+        if len(self.samples) < self.maxSamples:
+            self.samples.append(sample)
+
+    def report(self):
+        return {'count': self.count, 'samples': self.samples}
+
+
+def _describe(record, limit=200):
+    text = repr(record)
+    return text if len(text) <= limit else text[:limit] + '...'
+
+
+class ResultValidator:
+    def __init__(self, vqa, quesIds=None, maxSamples=10):
+        """Validator of results for a VQA object.
+
+        Args:
+            vqa (VQA): object whose question ids the results must cover, as in loadRes (the annotated questions, or all the questions without annotations)
+            quesIds (list, optional): expected question ids instead. Defaults to None.
+            maxSamples (int, optional): samples kept for every kind of problem. Defaults to 10.
+        """
+        self.vqa        = vqa
+        self.quesIds    = quesIds if quesIds is not None else vqa.filterIndex().quesIds
+        self.rank       = {quesId: i for i, quesId in enumerate(self.quesIds)} if quesIds is not None else vqa.filterIndex().rank
+        self.maxSamples = maxSamples
+        self.multipleChoice = vqa.questions.get('task_type') == 'Multiple Choice'
+
+    def validateRecords(self, records):
+        """Validate an iterable of result records.
+
+        Returns:
+            dict: validation report, see validateFile
+        """
+        checker = _Checker(self)
+        for record in records:
+            checker(record)
+        return checker.report()
+
+    def validateFile(self, resFile, chunkSize=2**20, maxRecordSize=2**26):
+        """Validate a result file, streaming it.
+
+        Args:
+            resFile (str): result file name, plain, compressed or in a .zip archive (see openInput)
+            chunkSize (int, optional): number of characters read at a time. Defaults to 2**20.
+            maxRecordSize (int, optional): maximum number of characters of one record. Defaults to 2**26.
+
+        Returns:
+            dict: 'valid', 'records', 'expected', 'missing', 'unknown', 'duplicate', 'malformed', 'invalidChoice' (count and samples) and 'parseError'
+        """
+        checker = _Checker(self)
+        try:
+            with openInput(resFile) as fh:
+                streamJsonArray(fh, checker, chunkSize, maxRecordSize)
+        except ValueError as error:
+            checker.parseError = '%s, after %d records' % (error, checker.records)
+        return checker.report()
+
+
+class _Checker:
+    def __init__(self, validator):
+        self.rank       = validator.rank
+        self.quesIds    = validator.quesIds
+        self.seen       = np.zeros(len(self.quesIds), dtype=bool)
+        self.records    = 0
+        self.parseError = None
+        self.choices    = validator.vqa.multipleChoiceIndex() if validator.multipleChoice else None
+        self.unknown    = _Problems(validator.maxSamples)
+        self.duplicate  = _Problems(validator.maxSamples)
+        self.malformed  = _Problems(validator.maxSamples)
+        self.invalidChoice = _Problems(validator.maxSamples)
+        self.maxSamples = validator.maxSamples
+
+    def __call__(self, record):
+        index = self.records
+        self.records += 1
+        if type(record) != dict:
+            self.malformed.add({'index': index, 'reason': 'not an object', 'record': _describe(record)})
+            return
+        quesId = record.get('question_id')
+        if type(quesId) != int:
+            self.malformed.add({'index': index, 'reason': 'question_id missing or not an integer', 'record': _describe(record)})
+            return
+        if type(record.get('answer')) != str:
+            self.malformed.add({'index': index, 'reason': 'answer missing or not a string', 'record': _describe(record)})
+            return
+        row = self.rank.get(quesId)
+        if row is None:
+            self.unknown.add(quesId)
+            return
+        if self.seen[row]:
+            self.duplicate.add(quesId)
+            return
+        self.seen[row] = True
+        if self.choices is not None:
+            choices = self.choices
+            code = choices.codebook.codes.get(record['answer'], -1)
+            if code < 0 or not (choices.choices[choices.rank[quesId]] == code).any():
+                self.invalidChoice.add({'question_id': quesId, 'answer': record['answer']})
+
+    def report(self):
+        missing = np.flatnonzero(~self.seen)
+        report = {'records': self.records,
+                  'expected': len(self.quesIds),
+                  'missing': {'count': int(len(missing)), 'samples': [self.quesIds[i] for i in missing[:self.maxSamples].tolist()]},
+                  'unknown': self.unknown.report(),
+                  'duplicate': self.duplicate.report(),
+                  'malformed': self.malformed.report(),
+                  'invalidChoice': self.invalidChoice.report(),
+                  'parseError': self.parseError}
+        report['valid'] = self.parseError is None and all(report[key]['count'] == 0 for key in
+                                                          ('missing', 'unknown', 'duplicate', 'malformed', 'invalidChoice'))
+        return report
+
+
+def formatReport(report):
+    """Human readable summary of a validation report.
+
+    Args:
+        report (dict): result of ResultValidator.validateFile or validateRecords
+
+    Returns:
+        str: one line per problem
+    """
+    lines = ['%s: %d records, %d expected question ids' % ('OK' if report['valid'] else 'INVALID', report['records'], report['expected'])]
+    if report['parseError'] is not None:
+        lines.append('parse error: %s' % report['parseError'])
+    for key, label in (('missing', 'missing question ids'), ('unknown', 'unknown question ids'),
+                       ('duplicate', 'duplicate question ids'), ('malformed', 'malformed records'),
+                       ('invalidChoice', 'answers not among the multiple choices')):
+        if report[key]['count']:
+            lines.append('%d %s, e.g. %s' % (report[key]['count'], label, report[key]['samples']))
+    return '\n'.join(lines)
+
+
+if __name__ == '__main__':
+    from .vqa import VQA
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument(
+        "--quesFile",
+        type=str,
+        required=True,
+        help="Path to question file"
+    )
+    parser.add_argument(
+        "--annFile",
+        type=str,
+        default=None,
+        help="Path to annotation file (results must then cover the annotated questions)"
+    )
+    parser.add_argument(
+        "--resFile",
+        type=str,
+        required=True,
+        help="Path to result file"
+    )
+    parser.add_argument(
+        "--samples",
+        type=int,
+        default=10,
+        help="Samples reported for every kind of problem"
+    )
+    parser.add_argument(
+        "--json",
+        action='store_true',
+        help="Print the report as JSON"
+    )
+    args = parser.parse_args()
+
+    vqa = VQA(args.quesFile, args.annFile, compact=True)
+    report = ResultValidator(vqa, maxSamples=args.samples).validateFile(args.resFile)
+    print(json.dumps(report, indent=2) if args.json else formatReport(report))
+    sys.exit(0 if report['valid'] else 1)
@@ -0,0 +1,195 @@
+# coding=utf-8
+
+# Subset and concatenation views over VQA objects.
+
+# A view selects questions of one or more VQA objects (its parts) without copying their records:
+# q2q, q2a, imgToQA and the 'questions' and 'annotations' lists of the view look records up in
+# the parts. Nothing is resolved when the view is created; the selected rows and the filter index
+# of the view are computed from the filter indexes of the parts on first use, so carving a slice
+# costs nothing until it is queried. Views are VQA objects (VQA.subset, VQA.concat), so they can
+# be filtered, evaluated, used in loadRes and be the parts of other views.
+
+# The following are defined:
+#  VQAView  - selected questions of one or more VQA objects.
+
+import bisect
+from collections.abc import Mapping, Sequence
+
+import numpy as np
+
+from .vqaIndex import VQAIndex
+
+
+class VQAView:
+    def __init__(self, parts):
+        """Selection of the questions of VQA objects.
+
+        Args:
+            parts (list): (VQA object, selection) pairs; a selection is None for all the questions, or a dict of quesIds, imgIds, quesTypes and ansTypes conditions
+        """
+        assert len(parts) > 0, 'a view needs at least one VQA object'
+        annotated = [bool(vqa.annotations) for vqa, _ in parts]
+        assert all(annotated) or not any(annotated), 'cannot mix VQA objects with and without annotations'
+        taskTypes = set(vqa.questions.get('task_type') for vqa, _ in parts)
+        assert len(taskTypes) == 1, 'cannot mix task types %s' % sorted(taskTypes, key=str)
+        self.parts     = parts
+        self.annotated = annotated[0]
+        self._index    = None
+        self._starts   = None
+
+    def _select(self, vqa, selection):
+        # rows of the filter index of vqa, in dataset order
+        index = vqa.filterIndex()
+        if selection is None:
+            return np.arange(len(index.quesIds))
+        quesIds, imgIds = selection.get('quesIds'), selection.get('imgIds')
+        if quesIds is not None:
+            unknown = [quesId for quesId in quesIds if quesId not in index.rank]
+            assert not unknown, 'question ids not in the dataset, e.g. %s' % unknown[:5]
+            candidates = list(quesIds)
+            if imgIds is not None:
+                imgIds = set(imgIds)
+                candidates = [quesId for quesId in candidates if index.q2img[quesId] in imgIds]
+        elif imgIds is not None:
+            candidates = [quesId for imgId in imgIds for quesId in index.imgToQ.get(imgId, [])]
+        else:
+            candidates = None
+        if candidates is not None and not candidates:
+            return np.zeros(0, dtype=np.int64)
+        candidates = index.filter(quesIds=candidates, quesTypes=selection.get('quesTypes') or [],
+                                  ansTypes=selection.get('ansTypes') or [])
+        rank = index.rank
+        return np.unique(np.fromiter((rank[quesId] for quesId in candidates), dtype=np.int64, count=len(candidates)))
+
+    def index(self, questionTypes=None):
+        """Filter index of the selected questions, parts in order, each in dataset order.
+
+        Args:
+            questionTypes (dict, optional): question types assigned to the view, for views without annotations. Defaults to None.
+
+        Returns:
+            VQAIndex: question_type, answer_type and image_id indexes
+        """
+        if self._index is None or questionTypes is not None:
+            quesIds, imgIds, quesTypes, ansTypes, starts = [], [], [], [], []
+            for vqa, selection in self.parts:
+                index = vqa.filterIndex()
+                rows  = self._select(vqa, selection).tolist()
+                starts.append(len(quesIds))
+                quesIds.extend([index.quesIds[row] for row in rows])
+                imgIds.extend([index.imgIds[row] for row in rows])
+                if quesTypes is not None and index.quesTypes is not None:
+                    quesTypes.extend([index.quesTypes[row] for row in rows])
+                else:
+                    quesTypes = None
+                if ansTypes is not None and index.ansTypes is not None:
+                    ansTypes.extend([index.ansTypes[row] for row in rows])
+                else:
+                    ansTypes = None
+            if questionTypes is not None:
+                quesTypes = [questionTypes[quesId] for quesId in quesIds]
+            index = VQAIndex(quesIds, imgIds, quesTypes, ansTypes)
+            assert len(index.rank) == len(quesIds), 'the datasets of a view share question ids'
+            self._index, self._starts = index, starts
+        return self._index
+
+    def part(self, quesId):
+        """VQA object holding the records of a question of the view.
+
+        Raises:
+            KeyError: if the question is not in the view
+        """
+        if len(self.parts) == 1:
+            if quesId not in self.index().rank:
+                raise KeyError(quesId)
+            return self.parts[0][0]
+        row = self.index().rank[quesId]
+        return self.parts[bisect.bisect_right(self._starts, row) - 1][0]
+
+    def questions(self):
+        """Question file view: metadata members of the parts and a lazy 'questions' list.
+        """
+        return self._file([vqa.questions for vqa, _ in self.parts], 'questions', 'q2q')
+
+    def annotations(self):
+        """Annotation file view: metadata members of the parts and a lazy 'annotations' list, None without annotations.
+        """
+        if not self.annotated:
+            return None
+        return self._file([vqa.annotations for vqa, _ in self.parts], 'annotations', 'q2a')
+
+    def _file(self, files, key, name):
+        view = {member: value for member, value in files[0].items() if member != key}
+        subTypes = [f.get('data_subtype') for f in files]
+        if len(set(subTypes)) > 1:
+            view['data_subtype'] = '+'.join(str(subType) for subType in subTypes)
+        view[key] = _ViewList(self, self.map(name))
+        return view
+
+    def map(self, name):
+        """Question id to record mapping of the view, looked up in the q2q or q2a of the parts.
+        """
+        return _ViewMap(self, name)
+
+    def imageMap(self):
+        """Image id to annotation records mapping of the view, as VQA.imgToQA.
+        """
+        return _ViewImageMap(self)
+
+
+class _ViewMap(Mapping):
+    def __init__(self, view, name):
+        self.view = view
+        self.name = name
+
+    def __len__(self):
+        return len(self.view.index().quesIds)
+
+    def __iter__(self):
+        return iter(self.view.index().quesIds)
+
+    def __contains__(self, quesId):
+        return quesId in self.view.index().rank
+
+    def __getitem__(self, quesId):
+        return getattr(self.view.part(quesId), self.name)[quesId]
+
+
+class _ViewImageMap(Mapping):
+    def __init__(self, view):
+        self.view = view
+
+    def __len__(self):
+        return len(self.view.index().imgToQ)
+
+    def __iter__(self):
+        return iter(self.view.index().imgToQ)
+
+    def __contains__(self, imgId):
+        return imgId in self.view.index().imgToQ
+
+    def __getitem__(self, imgId):
+        rank = self.view.index().rank
+        if imgId not in self.view.index().imgToQ:
+            raise KeyError(imgId)
+        return [ann for vqa, _ in self.view.parts for ann in vqa.imgToQA.get(imgId, [])
+                if ann['question_id'] in rank and self.view.part(ann['question_id']) is vqa]
+
+
+class _ViewList(Sequence):
+    def __init__(self, view, records):
+        self.view    = view
+        self.records = records
+
+    def __len__(self):
+        return len(self.view.index().quesIds)
+
+    def __getitem__(self, i):
+        quesIds = self.view.index().quesIds
+        if isinstance(i, slice):
+            return [self.records[quesId] for quesId in quesIds[i]]
+        return self.records[quesIds[i]]
+
+    def __iter__(self):
+        records = self.records
+        return (records[quesId] for quesId in self.view.index().quesIds)
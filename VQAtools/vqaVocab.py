@@ -0,0 +1,196 @@
+# coding=utf-8
+
+# Answer vocabulary and soft-score targets for training VQA models.
+
+# Ground truth answers are normalized with the evaluation engine (the rules applied to
+# predicted answers by VQAEval), the most frequent ones form the vocabulary, and each question
+# gets a soft score min(1, count/3) for every vocabulary answer given by its annotators.
+# Scores are stored as a sparse CSR question x answer matrix which can be saved to a
+# directory of .npy files and memory-mapped by dataloader workers.
+
+# The following are defined:
+#  AnswerVocab       - top-K vocabulary of normalized answers.
+#  SoftScoreMatrix   - CSR question x answer soft scores.
+#  normalizedAnswers - normalized and coded ground truth answers of a VQA object.
+
+import json
+import os
+
+import numpy as np
+
+from .vqaNormalize import defaultNormalizer
+from .vqaScore import AnswerCodebook
+
+
+def normalizedAnswers(vqa, quesIds=None, normalizer=None):
+    """Normalized and coded ground truth answers.
+
+    Args:
+        vqa (VQA): object with annotations
+        quesIds (list, optional): question ids. Defaults to vqa.getQuesIds().
+        normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+
+    Returns:
+        tuple: (question ids, AnswerCodebook of normalized answers, Q x K codes with -1 padding)
+    """
+    assert vqa.annotations, 'Annotations not available!'
+    normalizer = normalizer if normalizer is not None else defaultNormalizer
+    quesIds = vqa.getQuesIds() if quesIds is None else list(quesIds)
+    store = vqa.store
+    if store is not None:
+        pos = np.searchsorted(store.qid_sorted, quesIds)
+        rows = np.asarray(store.qid_order)[np.minimum(pos, len(store) - 1)]
+        assert np.all(store.question_id[rows] == quesIds) and np.all(store.annotated[rows]), 'question ids not in the annotations'
+        raw = np.asarray(store.answers[rows])
+        rawString = store.strings.__getitem__
+        nRaw = len(store.strings)
+    else:
+        rawBook = AnswerCodebook()
+        answers = [[rawBook.add(ans['answer']) for ans in vqa.q2a[quesId]['answers']] for quesId in quesIds]
+        raw = np.full((len(quesIds), max([len(a) for a in answers] or [0])), -1, dtype=np.int64)
+        for i, a in enumerate(answers):
+            raw[i, :len(a)] = a
+        rawString = rawBook.strings.__getitem__
+        nRaw = len(rawBook)
+    # normalize every distinct raw answer once
+    book = AnswerCodebook()
+    lookup = np.full(nRaw + 1, -1, dtype=np.int64)
+    for c in np.unique(raw[raw >= 0]).tolist():
+        lookup[c] = book.add(normalizer.normalize(rawString(c)))
+    return quesIds, book, lookup[raw]
+
+
+class AnswerVocab(AnswerCodebook):
+    """Vocabulary of normalized answers. Answer i is the i-th output of a classifier.
+    """
+
+    @classmethod
+    def build(cls, vqa, topK=3129, minCount=1, quesIds=None, normalizer=None):
+        """Build the vocabulary of the most frequent normalized ground truth answers.
+
+        Args:
+            vqa (VQA): object with annotations
+            topK (int, optional): maximum vocabulary size, None for no limit. Defaults to 3129.
+            minCount (int, optional): minimum number of occurrences of an answer. Defaults to 1.
+            quesIds (list, optional): questions whose answers are counted. Defaults to all the annotated questions.
+            normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+
+        Returns:
+            AnswerVocab: answers sorted by decreasing frequency, ties in order of first appearance
+        """
+        _, book, codes = normalizedAnswers(vqa, quesIds, normalizer)
+        counts = np.bincount(codes[codes >= 0], minlength=len(book))
+        order = np.argsort(-counts, kind='stable')
+        order = order[counts[order] >= minCount]
+        if topK is not None:
+            order = order[:topK]
+        return cls(book.strings[c] for c in order.tolist())
+
+    def save(self, path):
+        """Write the vocabulary as a JSON list of answers.
+        """
+        with open(path, 'w') as fh:
+            json.dump(self.strings, fh)
+
+    @classmethod
+    def load(cls, path):
+        """Load a vocabulary written by save.
+        """
+        with open(path) as fh:
+            return cls(json.load(fh))
+
+    def scoreMatrix(self, vqa, quesIds=None, normalizer=None):
+        """Soft scores min(1, count/3) of every vocabulary answer for every question.
+
+        Args:
+            vqa (VQA): object with annotations
+            quesIds (list, optional): rows of the matrix. Defaults to vqa.getQuesIds().
+            normalizer (AnswerNormalizer, optional): normalization engine. Defaults to the shared one.
+
+        Returns:
+            SoftScoreMatrix: Q x len(self) sparse scores
+        """
+        quesIds, book, codes = normalizedAnswers(vqa, quesIds, normalizer)
+        toVocab = np.append(self.encode(book.strings), -1)
+        codes = toVocab[codes]
+        nQues, width = codes.shape
+        rows = np.repeat(np.arange(nQues, dtype=np.int64), width)
+        codes = codes.ravel()
+        valid = codes >= 0
+        # (row, answer) pairs sorted by row then answer, with their number of occurrences
+        stride = max(len(self), 1)
+        keys, counts = np.unique(rows[valid]*stride + codes[valid], return_counts=True)
+        indptr = np.zeros(nQues + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys//stride, minlength=nQues), out=indptr[1:])
+        return SoftScoreMatrix(np.asarray(quesIds, dtype=np.int64), indptr, (keys % stride).astype(np.int32),
+                               np.minimum(1., counts/3.).astype(np.float32), len(self))
+
+
+class SoftScoreMatrix:
+    arrays = ['question_id', 'indptr', 'indices', 'data']
+
+    def __init__(self, quesIds, indptr, indices, data, nAnswers):
+        """Sparse CSR question x answer soft scores.
+
+        Args:
+            quesIds (numpy.ndarray): question id of each row
+            indptr (numpy.ndarray): Q + 1 row offsets into indices and data
+            indices (numpy.ndarray): answer codes
+            data (numpy.ndarray): scores
+            nAnswers (int): number of columns
+        """
+        self.quesIds  = quesIds
+        self.indptr   = indptr
+        self.indices  = indices
+        self.data     = data
+        self.shape    = (len(quesIds), nAnswers)
+        self._rows    = None
+
+    def __len__(self):
+        return self.shape[0]
+
+    def row(self, quesId):
+        """Row of a question id.
+        """
+        if self._rows is None:
+            self._rows = {quesId: i for i, quesId in enumerate(self.quesIds.tolist())}
+        return self._rows[quesId]
+
+    def scores(self, i):
+        """Answer codes and scores of row i.
+        """
+        return self.indices[self.indptr[i]:self.indptr[i+1]], self.data[self.indptr[i]:self.indptr[i+1]]
+
+    def dense(self, rows):
+        """Dense len(rows) x nAnswers float32 targets for a batch of rows.
+        """
+        out = np.zeros((len(rows), self.shape[1]), dtype=np.float32)
+        for i, row in enumerate(rows):
+            indices, data = self.scores(row)
+            out[i, indices] = data
+        return out
+
+    def toScipy(self):
+        """Return a scipy.sparse.csr_matrix view of the scores (requires scipy).
+        """
+        from scipy.sparse import csr_matrix
+        return csr_matrix((self.data, self.indices, self.indptr), shape=self.shape)
+
+    def save(self, path):
+        """Write the matrix to a directory of .npy files.
+        """
+        os.makedirs(path, exist_ok=True)
+        for name, array in zip(self.arrays, (self.quesIds, self.indptr, self.indices, self.data)):
+            np.save(os.path.join(path, name + '.npy'), array)
+        with open(os.path.join(path, 'meta.json'), 'w') as fh:
+            json.dump({'shape': list(self.shape)}, fh)
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """Load a matrix written by save, memory-mapped by default.
+        """
+        with open(os.path.join(path, 'meta.json')) as fh:
+            meta = json.load(fh)
+        mode = 'r' if mmap else None
+        quesIds, indptr, indices, data = [np.load(os.path.join(path, name + '.npy'), mmap_mode=mode) for name in cls.arrays]
+        return cls(quesIds, indptr, indices, data, meta['shape'][1])
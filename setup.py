@@ -12,6 +12,8 @@ setuptools.setup(
                  "Matteo A. Senese",
      url="https://github.com/seo-95/VQA",
      packages=setuptools.find_packages(),
+     package_data={'VQAtools': ['QuestionTypes/*.txt']},
+     install_requires=['numpy'],
      classifiers=[
          "Programming Language :: Python :: 3",
          "License :: OSI Approved :: MIT License",
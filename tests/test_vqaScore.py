@@ -0,0 +1,126 @@
+# coding=utf-8
+
+# Regression tests of the vectorized VQA accuracy against the original per-question loop.
+
+# The reference below is the loop of the original VQAEval.evaluate, with its regex-based
+# processPunctuation and processDigitArticle, over the rule tables of vqaNormalize.
+
+# Run with:
+#     python -m pytest tests/test_vqaScore.py
+# or
+#     python -m unittest tests.test_vqaScore
+
+import os
+import random
+import re
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VQAtools.vqaNormalize import AnswerNormalizer, articles, commaStrip, contractions, manualMap, periodStrip, punct
+from VQAtools.vqaScore import AnswerCodebook, scoreCodes
+
+
+def _processPunctuation(inText):
+    outText = inText
+    for p in punct:
+        if (p + ' ' in inText or ' ' + p in inText) or (re.search(commaStrip, inText) != None):
+            outText = outText.replace(p, '')
+        else:
+            outText = outText.replace(p, ' ')
+    outText = periodStrip.sub("",
+                              outText,
+                              re.UNICODE)
+    return outText
+
+
+def _processDigitArticle(inText):
+    outText = []
+    tempText = inText.lower().split()
+    for word in tempText:
+        word = manualMap.get(word, word)
+        if word not in articles:
+            outText.append(word)
+        else:
+            pass
+    for wordId, word in enumerate(outText):
+        if word in contractions:
+            outText[wordId] = contractions[word]
+    outText = ' '.join(outText)
+    return outText
+
+
+def _originalAccuracy(gtAnswers, resAns):
+    # one question of the loop of the original VQAEval.evaluate
+    answers = [{'answer': ans, 'answer_id': i + 1} for i, ans in enumerate(gtAnswers)]
+    resAns = resAns.replace('\n', ' ')
+    resAns = resAns.replace('\t', ' ')
+    resAns = resAns.strip()
+    resAns = _processPunctuation(resAns)
+    resAns = _processDigitArticle(resAns)
+    gtAcc = []
+    if len(set(gtAnswers)) > 1:
+        for ansDic in answers:
+            ansDic['answer'] = _processPunctuation(ansDic['answer'])
+    for gtAnsDatum in answers:
+        otherGTAns = [item for item in answers if item != gtAnsDatum]
+        matchingAns = [item for item in otherGTAns if item['answer'] == resAns]
+        acc = min(1, float(len(matchingAns))/3)
+        gtAcc.append(acc)
+    return float(sum(gtAcc))/len(gtAcc)
+
+
+def _scoreAll(questions, predictions, normalizer):
+    # ground truth and predictions coded as VQAGroundTruth does
+    codebook = AnswerCodebook()
+    width = max(len(gtAnswers) for gtAnswers in questions)
+    gtCodes = np.full((len(questions), width), -1, dtype=np.int64)
+    for i, gtAnswers in enumerate(questions):
+        if len(set(gtAnswers)) > 1:
+            gtAnswers = [normalizer.processPunctuation(ans) for ans in gtAnswers]
+        gtCodes[i, :len(gtAnswers)] = [codebook.add(ans) for ans in gtAnswers]
+    resCodes = codebook.encode(normalizer.normalize(ans) for ans in predictions)
+    return scoreCodes(gtCodes, resCodes)
+
+
+_words = ['yes', 'no', 'two', '2', 'none', 'red', 'the dog', 'a dog', 'dog.', 'dogs', 'isnt', "isn't",
+          'tennis racket', 'tennis-racket', 'tennis/racket', '1,000', '1000', '10.5', 'man; woman', 'x (y)',
+          'mr. smith', 'ten', '10', 'Yes', 'yes!', '"no"', 'dont', 'oclock', '']
+
+
+def _randomAnswer(rng):
+    answer = rng.choice(_words)
+    if rng.random() < 0.2:
+        answer = rng.choice(['%s ', ' %s', '%s\t', '%s\nok', 'the %s', '%s?']) % answer
+    return answer
+
+
+class ScoreCodesTest(unittest.TestCase):
+    def testMatchPatterns(self):
+        # every number of matches among 10, 3 and 1 ground truth answers
+        questions, predictions = [], []
+        for nAnswers in (10, 3, 1):
+            for count in range(nAnswers + 1):
+                questions.append(['yes']*count + ['no']*(nAnswers - count))
+                predictions.append('yes')
+        accs = _scoreAll(questions, predictions, AnswerNormalizer())
+        self.assertEqual(accs.tolist(), [_originalAccuracy(q, p) for q, p in zip(questions, predictions)])
+
+    def testOriginalLoop(self):
+        rng = random.Random(0)
+        questions, predictions = [], []
+        for _ in range(3000):
+            latent = _randomAnswer(rng)
+            nAnswers = rng.choice([10, 10, 10, 3])
+            questions.append([latent if rng.random() < rng.random() else _randomAnswer(rng) for _ in range(nAnswers)])
+            predictions.append(latent if rng.random() < 0.5 else _randomAnswer(rng))
+        accs = _scoreAll(questions, predictions, AnswerNormalizer())
+        expected = [_originalAccuracy(q, p) for q, p in zip(questions, predictions)]
+        self.assertEqual(accs.tolist(), expected)
+
+
+if __name__ == '__main__':
+    unittest.main()
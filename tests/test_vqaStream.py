@@ -0,0 +1,70 @@
+# coding=utf-8
+
+# Regression tests of the streaming JSON reader.
+
+# Run with:
+#     python -m pytest tests/test_vqaStream.py
+# or
+#     python -m unittest tests.test_vqaStream
+
+import io
+import json
+import os
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from VQAtools.vqaStream import streamJson, streamJsonArray
+
+
+class _CountingReader(io.StringIO):
+    def __init__(self, text):
+        io.StringIO.__init__(self, text)
+        self.chars = 0
+
+    def read(self, size=-1):
+        chunk = io.StringIO.read(self, size)
+        self.chars += len(chunk)
+        return chunk
+
+
+def _results(n):
+    return [{'question_id': i, 'answer': 'answer "%d" é\\n' % i, 'score': -1.5e-3*i} for i in range(n)]
+
+
+class StreamJsonTest(unittest.TestCase):
+    def testSmallChunks(self):
+        # values cut by chunk boundaries anywhere: strings, escapes, numbers, literals
+        results = _results(50) + [True, False, None, [], {}]
+        text = json.dumps(results)
+        for chunkSize in (1, 2, 3, 5, 7, 64):
+            records = []
+            streamJsonArray(io.StringIO(text), records.append, chunkSize)
+            self.assertEqual(records, results)
+
+    def testObject(self):
+        document = {'info': {'year': 2017}, 'questions': _results(20), 'license': 'cc'}
+        records = []
+        members = streamJson(io.StringIO(json.dumps(document)), 'questions', records.append, chunkSize=4)
+        self.assertEqual(records, document['questions'])
+        self.assertEqual(members, {'info': {'year': 2017}, 'license': 'cc'})
+
+    def testEarlyMalformedRecord(self):
+        # a malformed key in the first record must fail without reading the rest of the file
+        text = '[{"question_id": 1, answer: "yes"}, ' + json.dumps(_results(20000))[1:]
+        fileobj = _CountingReader(text)
+        with self.assertRaises(ValueError):
+            streamJsonArray(fileobj, lambda record: None, chunkSize=4096)
+        self.assertLessEqual(fileobj.chars, 4096)
+
+    def testMaxRecordSize(self):
+        text = '[{"question_id": 1, "answer": "' + 'x'*100000 + '"}]'
+        fileobj = _CountingReader(text)
+        with self.assertRaises(ValueError):
+            streamJsonArray(fileobj, lambda record: None, chunkSize=1024, maxRecordSize=10000)
+        self.assertLess(fileobj.chars, 20000)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,216 @@
+# coding: utf-8
+
+import argparse
+import datetime
+import gc
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from VQAtools import VQA, VQAEval
+from VQAtools.vqaStream import peakRSS
+from VQAtools.vqaSynthetic import generate
+
+
+def gitCommit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', 'HEAD'], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def measure(setup, target, repeat):
+    """Time target(*setup()) repeat times, then run it once more under tracemalloc.
+
+    Returns:
+        dict: min, median and all run times in seconds, peak traced allocation in MB
+    """
+    times = []
+    for _ in range(repeat):
+        args = setup()
+        gc.collect()
+        tic = time.perf_counter()
+        target(*args)
+        times.append(time.perf_counter() - tic)
+        del args
+    args = setup()
+    gc.collect()
+    tracemalloc.start()
+    target(*args)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {'min': min(times), 'median': statistics.median(times), 'times': times, 'peakMB': peak/2.**20}
+
+
+def benchmarks(paths, workers):
+    quesFile, annFile, resFile = paths['questions'], paths['annotations'], paths['results']
+    vqa = VQA(quesFile, annFile)
+    vqaRes = vqa.loadRes(resFile)
+    quesTypes = ['how many', 'what color is the']
+    imgIds = vqa.getImgIds()[:1000]
+    def fresh():
+        vqa._filterIndex = None
+        return (vqa,)
+    def freshGroundTruth():
+        vqa._groundTruth = (None, {})
+        return (vqa,)
+    def evaluator():
+        # evaluations share the ground truth snapshot, timed by VQA.groundTruth
+        vqa.groundTruth()
+        return (VQAEval(vqa, vqaRes),)
+    def query(**kwargs):
+        vqa.filterIndex()
+        return lambda: (kwargs,)
+    return [('VQA.__init__',              lambda: (), lambda: VQA(quesFile, annFile)),
+            ('VQA.__init__(stream)',      lambda: (), lambda: VQA(quesFile, annFile, stream=True)),
+            ('VQA.__init__(compact)',     lambda: (), lambda: VQA(quesFile, annFile, compact=True)),
+            ('createIndex',               lambda: (vqa,), lambda v: v.createIndex()),
+            ('filterIndex',               fresh, lambda v: v.filterIndex()),
+            ('getQuesIds()',              query(), lambda kw: vqa.getQuesIds(**kw)),
+            ('getQuesIds(quesTypes)',     query(quesTypes=quesTypes), lambda kw: vqa.getQuesIds(**kw)),
+            ('getQuesIds(ansTypes)',      query(ansTypes='yes/no'), lambda kw: vqa.getQuesIds(**kw)),
+            ('getQuesIds(imgIds)',        query(imgIds=imgIds), lambda kw: vqa.getQuesIds(**kw)),
+            ('loadRes',                   lambda: (), lambda: vqa.loadRes(resFile)),
+            ('VQA.groundTruth',           freshGroundTruth, lambda v: v.groundTruth()),
+            ('VQAEval.evaluate',          evaluator, lambda e: e.evaluate()),
+            ('VQAEval.evaluate(workers)', evaluator, lambda e: e.evaluate(workers=workers))]
+
+
+def compare(current, previous, tolerance):
+    """Print the ratio of current / previous median times and peaks.
+
+    Returns:
+        list: names of the benchmarks slower than (1 + tolerance) times the previous run
+    """
+    regressions = []
+    print('%-28s %10s %10s %8s %10s' % ('benchmark', 'median', 'previous', 'ratio', 'peak ratio'))
+    for name, result in current['results'].items():
+        old = previous['results'].get(name)
+        if old is None:
+            print('%-28s %10.4f %10s' % (name, result['median'], '-'))
+            continue
+        ratio = result['median']/old['median'] if old['median'] else float('inf')
+        peakRatio = result['peakMB']/old['peakMB'] if old['peakMB'] else float('inf')
+        print('%-28s %10.4f %10.4f %8.2f %10.2f' % (name, result['median'], old['median'], ratio, peakRatio))
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+    return regressions
+
+
+if __name__ == '__main__':
+    """
+    example usage:
+        python -m tests.vqaBenchmark \
+            --dataDir /tmp/vqa_synthetic \
+            --output benchmark.json \
+            --compare previous_benchmark.json
+    """
+
+    parser = argparse.ArgumentParser()
+
+    parser.add_argument(
+        "--dataDir",
+        type=str,
+        required=True,
+        help="Directory of the synthetic dataset, generated if missing"
+    )
+    parser.add_argument(
+        "--questions",
+        type=int,
+        default=443757,
+        help="Number of synthetic questions (default: size of VQA v2 train)"
+    )
+    parser.add_argument(
+        "--seed",
+        type=int,
+        default=0,
+        help="Random seed of the synthetic dataset"
+    )
+    parser.add_argument(
+        "--repeat",
+        type=int,
+        default=3,
+        help="Timed runs of each benchmark"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=4,
+        help="Worker processes of the parallel evaluation benchmark"
+    )
+    parser.add_argument(
+        "--only",
+        type=str,
+        nargs='*',
+        default=None,
+        help="Names of the benchmarks to run (default: all)"
+    )
+    parser.add_argument(
+        "--output",
+        type=str,
+        default=None,
+        help="Write the results to this JSON file"
+    )
+    parser.add_argument(
+        "--compare",
+        type=str,
+        default=None,
+        help="JSON results of a previous run to compare with"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=0.1,
+        help="Relative slowdown reported as a regression by --compare"
+    )
+
+    args = parser.parse_args()
+
+    paths = None
+    metaFile = os.path.join(args.dataDir, 'benchmark_dataset.json')
+    dataset = {'questions': args.questions, 'seed': args.seed}
+    if os.path.isfile(metaFile):
+        with open(metaFile) as fh:
+            stored = json.load(fh)
+        if stored['dataset'] == dataset:
+            paths = stored['paths']
+    if paths is None:
+        print('generating %d synthetic questions in %s' % (args.questions, args.dataDir))
+        paths = generate(args.dataDir, args.questions, seed=args.seed)
+        with open(metaFile, 'w') as fh:
+            json.dump({'dataset': dataset, 'paths': paths}, fh)
+
+    current = {'meta': {'date': datetime.datetime.now().isoformat(),
+                        'commit': gitCommit(),
+                        'python': sys.version.split()[0],
+                        'numpy': np.__version__,
+                        'platform': platform.platform(),
+                        'cpus': os.cpu_count(),
+                        'repeat': args.repeat,
+                        'dataset': dataset,
+                        'fileSizesMB': {kind: os.path.getsize(path)/2.**20 for kind, path in paths.items()}},
+               'results': {}}
+    for name, setup, target in benchmarks(paths, args.workers):
+        if args.only and name not in args.only:
+            continue
+        current['results'][name] = result = measure(setup, target, args.repeat)
+        print('%-28s median %8.4fs  min %8.4fs  peak %8.1f MB' % (name, result['median'], result['min'], result['peakMB']))
+    current['meta']['peakRSSMB'] = peakRSS()
+
+    if args.output:
+        with open(args.output, 'w') as fh:
+            json.dump(current, fh, indent=2)
+    if args.compare:
+        with open(args.compare) as fh:
+            regressions = compare(current, json.load(fh), args.tolerance)
+        if regressions:
+            print('regressions: %s' % ', '.join(regressions))
+            sys.exit(1)
@@ -18,7 +18,7 @@ def demo(annFile, quesFile, imgDir, dataSubType):
 
     # load and display QA annotations for given question types
     """
-    All possible quesTypes for abstract and mscoco has been provided in respective text files in ../QuestionTypes/ folder.
+    All possible quesTypes for abstract and mscoco has been provided in respective text files in ../VQAtools/QuestionTypes/ folder.
     """
     annIds = vqa.getQuesIds(quesTypes='how many');
     anns = vqa.loadQA(annIds)